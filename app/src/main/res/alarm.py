@@ -1,72 +1,830 @@
 import os
 import time
-from datetime import datetime, timedelta
+import argparse
+import threading
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 import pygame
-import urllib.request
-import json
+from alarm_engine import AlarmEngine, HolidayProvider, SettingsStore, format_clock, MONTHS
+from alarm_stats import FrameStats, percentile
 
-# Set the working directory to the script's location to ensure assets are found
-os.chdir(os.path.dirname(os.path.abspath(__file__)))
+# Assets are resolved relative to the script's location, not the working directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class AssetIndex:
+    """Case-insensitive index of one asset directory, built from a single scan.
+
+    refresh() rescans only when the directory's mtime has changed, so it is
+    cheap enough to call whenever a fresh file listing matters.
+    """
+    SOUND_EXTENSIONS = ('.mp3', '.wav')
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.names = set()
+        self.by_lower = {}
+        self.mtime = None
+        self.rescan()
+
+    def rescan(self):
+        try:
+            self.mtime = os.stat(self.directory).st_mtime
+            names = os.listdir(self.directory)
+        except OSError:
+            self.mtime = None
+            names = []
+        self.names = set(names)
+        self.by_lower = {f.lower(): f for f in sorted(names)}
+
+    def refresh(self):
+        """Rescan if the directory changed since the last scan. Returns True if it did."""
+        try:
+            mtime = os.stat(self.directory).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self.mtime:
+            return False
+        self.rescan()
+        return True
+
+    def resolve(self, filename):
+        """Full path of `filename` in the directory, matched case-insensitively, or None."""
+        if filename in self.names:
+            return os.path.join(self.directory, filename)
+        actual_name = self.by_lower.get(filename.lower())
+        if actual_name:
+            return os.path.join(self.directory, actual_name)
+        return None
+
+    def sound_files(self):
+        return sorted(f for f in self.names if f.lower().endswith(self.SOUND_EXTENSIONS))
+
+class AssetStore(dict):
+    """Asset surfaces by key. Deferred entries hold a decode future and are
+    converted to the display format on the main thread the first time they
+    are looked up."""
 
-class AlarmClockApp:
     def __init__(self):
+        super().__init__()
+        self.pending = {}
+
+    def defer(self, key, future):
+        self.pending[key] = future
+
+    def __missing__(self, key):
+        future = self.pending.pop(key, None)
+        if future is None:
+            raise KeyError(key)
+        img = future.result()
+        if img is not None:
+            img = img.convert_alpha()
+        self[key] = img
+        return img
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def wait(self):
+        """Block until every deferred decode has finished; entries still convert on first lookup."""
+        for future in list(self.pending.values()):
+            future.result()
+
+class StreamedSound:
+    """Sound-like wrapper that plays a file through pygame.mixer.music.
+
+    The file is streamed from disk instead of being decoded into memory.
+    Only one streamed sound can play at a time.
+    """
+    current = None
+
+    def __init__(self, path):
+        self.path = path
+
+    def play(self, loops=0):
+        pygame.mixer.music.load(self.path)
+        pygame.mixer.music.play(loops)
+        StreamedSound.current = self
+
+    def stop(self):
+        if StreamedSound.current is self:
+            pygame.mixer.music.stop()
+            StreamedSound.current = None
+
+    def get_num_channels(self):
+        return 1 if StreamedSound.current is self and pygame.mixer.music.get_busy() else 0
+
+class SoundCache:
+    """LRU cache of decoded sounds keyed by (path, mtime), bounded by decoded bytes.
+
+    Files larger than `stream_threshold` bytes on disk are returned as
+    StreamedSound instead of being decoded; pass None to always decode.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, stream_threshold=4 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.stream_threshold = stream_threshold
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.decodes = 0
+        self.lock = threading.Lock()
+        # Keys being decoded right now; other loaders of the same key wait for it
+        self.loading = {}
+
+    def sound_bytes(self, sound):
+        freq, fmt, channels = pygame.mixer.get_init()
+        return int(sound.get_length() * freq * channels * (abs(fmt) // 8))
+
+    def load(self, path, counters=None):
+        """Cached Sound (or StreamedSound) for `path`; a decode bumps counters['sound_decodes']."""
+        st = os.stat(path)
+        if self.stream_threshold is not None and st.st_size > self.stream_threshold:
+            return StreamedSound(path)
+
+        key = (path, st.st_mtime)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                self.entries.move_to_end(key)
+                return entry[0]
+            waiter = self.loading.get(key)
+            if waiter is None:
+                self.loading[key] = threading.Event()
+        if waiter is not None:
+            waiter.wait()
+            return self.load(path, counters)
+
+        try:
+            sound = pygame.mixer.Sound(path)
+            size = self.sound_bytes(sound)
+        finally:
+            with self.lock:
+                self.loading.pop(key).set()
+        with self.lock:
+            self.decodes += 1
+            if counters is not None:
+                counters['sound_decodes'] += 1
+            if key not in self.entries:
+                self.entries[key] = (sound, size)
+                self.total_bytes += size
+            # Evict least recently used, always keeping the newest entry
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                _, (_, old_size) = self.entries.popitem(last=False)
+                self.total_bytes -= old_size
+        return sound
+
+def init_offscreen_display():
+    """Open a hidden 1x1 display unless one exists.
+
+    convert()/convert_alpha() need a display format even when every frame
+    is drawn offscreen.
+    """
+    if pygame.display.get_surface() is None:
+        pygame.display.set_mode((1, 1), pygame.HIDDEN)
+
+def parse_size(text):
+    """'WIDTHxHEIGHT' command line argument as a (width, height) tuple."""
+    return tuple(int(v) for v in text.lower().split('x'))
+
+def reserve_channels(first, count):
+    """Reserve mixer channels first..first+count-1 so Sound.play() never takes them.
+
+    Returns the channels, or None when the mixer is not available.
+    """
+    if not pygame.mixer.get_init():
+        return None
+    total = first + count
+    if pygame.mixer.get_num_channels() < total + 8:
+        pygame.mixer.set_num_channels(total + 8)
+    pygame.mixer.set_reserved(total)
+    return [pygame.mixer.Channel(i) for i in range(first, total)]
+
+class PygameAlarmAudio:
+    """AlarmEngine audio backend that loops the selected alarm Sound.
+
+    With a channel the alarm plays on that mixer channel only, so several
+    clocks can ring the same cached Sound independently. Such a backend can
+    also be armed: a timer thread then starts the alarm at the exact fire
+    time instead of waiting for the next update(). With a second `probe`
+    channel every armed start is timed to its first mixed sample.
+    """
+
+    # The timer thread sleeps until this close to the deadline, then spins
+    SPIN = 0.002
+
+    def __init__(self, channel=None, probe=None):
+        self.sound = None
+        self.channel = channel
+        self.probe = probe
+        self.probe_sound = None
+        # (sound it was made from, that sound decoded in the mixer's format); the
+        # timer thread publishes both at once so play_alarm() never sees a torn pair
+        self.prepared = (None, None)
+        self.wake = threading.Condition()
+        self.deadline = None
+        self.thread = None
+        # Started by the timer thread and not yet taken over by play_alarm()
+        self.triggered = False
+        # Recent armed start timings, see onset_stats()
+        self.onsets = deque(maxlen=64)
+
+    def on_channel(self):
+        return self.channel is not None and isinstance(self.sound, pygame.mixer.Sound)
+
+    def play_alarm(self):
+        with self.wake:
+            if self.triggered:
+                self.triggered = False
+                if self.channel.get_busy():
+                    # Already started on time by the timer thread
+                    return
+        source, prepared = self.prepared
+        sound = prepared if source is self.sound else self.sound
+        if not sound:
+            return
+        if self.channel is not None and isinstance(sound, pygame.mixer.Sound):
+            self.channel.play(sound, loops=-1)
+        else:
+            sound.play(-1)
+
+    def stop_alarm(self):
+        with self.wake:
+            self.triggered = False
+        if self.channel is not None:
+            self.channel.stop()
+        if self.sound and not self.on_channel():
+            self.sound.stop()
+        self.release()
+
+    def release(self):
+        """Drop a streamed sound's fully decoded copy; it lives outside SoundCache's byte cap."""
+        with self.wake:
+            source, prepared = self.prepared
+            if prepared is not source:
+                self.prepared = (None, None)
+
+    def is_playing(self):
+        if self.channel is not None and self.channel.get_busy():
+            return True
+        if self.on_channel():
+            return False
+        return bool(self.sound) and self.sound.get_num_channels() > 0
+
+    def prepare(self):
+        """Return `sound` ready to start on a channel with no decoding or conversion left to do."""
+        sound = self.sound
+        source, prepared = self.prepared
+        if sound is not source:
+            if sound is None or isinstance(sound, pygame.mixer.Sound):
+                # Decoding a Sound already converted it to the mixer's format
+                prepared = sound
+            else:
+                # Streamed music is decoded and resampled as it plays; decode it all now.
+                # Only an armed alarm holds the copy, until release()
+                try:
+                    prepared = pygame.mixer.Sound(sound.path)
+                except pygame.error as e:
+                    print(f"Error preparing alarm sound: {e}")
+                    prepared = None
+            self.prepared = (sound, prepared)
+        return prepared
+
+    def arm(self, deadline):
+        """Start the alarm at time.monotonic() `deadline` from a timer thread; None disarms.
+
+        Re-arming also stops a timed start that play_alarm() never took
+        over, i.e. the alarm was cancelled right at its fire time.
+        """
+        if self.channel is None:
+            return
+        with self.wake:
+            self.deadline = deadline
+            if self.triggered:
+                self.triggered = False
+                self.channel.stop()
+            self.wake.notify()
+            if deadline is not None and self.thread is None:
+                self.thread = threading.Thread(target=self.run_trigger, daemon=True)
+                self.thread.start()
+        if deadline is None and not self.channel.get_busy():
+            self.release()
+
+    def run_trigger(self):
+        while True:
+            with self.wake:
+                while self.deadline is None:
+                    self.wake.wait()
+                deadline = self.deadline
+            # Decode ahead, while there is still time until the deadline
+            self.prepare()
+            with self.wake:
+                while self.deadline == deadline and deadline - time.monotonic() > self.SPIN:
+                    self.wake.wait(deadline - time.monotonic() - self.SPIN)
+                if self.deadline != deadline:
+                    continue
+            while time.monotonic() < deadline:
+                pass
+            # Normally a no-op; picks up a sound changed since it was armed
+            sound = self.prepare()
+            with self.wake:
+                if self.deadline != deadline:
+                    continue
+                self.deadline = None
+                if sound is None or self.channel.get_busy():
+                    # Nothing to play, or an earlier alarm is still ringing
+                    continue
+                self.triggered = True
+            self.start_timed(sound, deadline)
+
+    def start_timed(self, sound, scheduled):
+        """Loop `sound` on the channel and record how long after `scheduled` it started.
+
+        The probe channel plays one silent frame along with the alarm; it
+        finishes in the mixer callback that mixes the alarm's first sample.
+        Without a probe only the call into the mixer is timed.
+        """
+        if self.probe is not None:
+            if self.probe_sound is None:
+                _, fmt, channels = pygame.mixer.get_init()
+                self.probe_sound = pygame.mixer.Sound(buffer=bytes(channels * (abs(fmt) // 8)))
+            self.probe.play(self.probe_sound)
+        self.channel.play(sound, loops=-1)
+        started = time.monotonic()
+        first = None
+        if self.probe is not None:
+            while self.probe.get_busy() and time.monotonic() - started < 1.0:
+                time.sleep(0.0002)
+            if not self.probe.get_busy():
+                first = time.monotonic()
+        self.onsets.append({
+            'start_ms': (started - scheduled) * 1000,
+            'first_sample_ms': None if first is None else (first - scheduled) * 1000,
+        })
+
+    def onset_stats(self, onsets=None):
+        """Scheduled-time-to-onset latency of `onsets` (default: the recent timed starts), in ms."""
+        onsets = list(self.onsets if onsets is None else onsets)
+        stats = {'onsets': len(onsets)}
+        for key in ('start_ms', 'first_sample_ms'):
+            values = [o[key] for o in onsets if o[key] is not None]
+            if values:
+                stats[key] = {'p50': percentile(values, 50), 'p99': percentile(values, 99), 'max': max(values)}
+        return stats
+
+class Layout:
+    """Every screen rect for one display size, computed once.
+
+    SPECS are (x, y, w, h) in the 1280x800 design the UI was drawn for and
+    are scaled to the actual display on each axis. Rects derived from them
+    (date and digit slots, control buttons, popup list geometry) are worked
+    out here as well, so drawing and hit-testing never build rects.
+    """
+    DESIGN_SIZE = (1280, 800)
+    SPECS = {
+        'sound_settings': (25, 16, 120, 100),
+        'settings': (166, 16, 120, 100),
+        'brightness': (307, 16, 120, 100),
+        'date_container': (1280 - 300 - 25, 16, 300, 80),
+        'digits_container': (128, 200, 1024, 320),
+        'alarm_btn': (515, 520, 250, 200),
+        'controls_layout': (440, 520, 400, 100),
+        'brightness_container': (390, 560, 500, 80),
+        # Popup Rects
+        'popup_bg': (340, 150, 600, 500),
+        'popup_select_btn': (340 + 240, 150 + 430, 120, 50),
+        'warning_popup_bg': (340, 250, 600, 300),
+        'warning_yes': (340 + 100, 250 + 200, 150, 60),
+        'warning_no': (340 + 350, 250 + 200, 150, 60),
+    }
+
+    def __init__(self, size):
+        self.size = tuple(size)
+        self.sx = self.size[0] / self.DESIGN_SIZE[0]
+        self.sy = self.size[1] / self.DESIGN_SIZE[1]
+        rects = {name: self.scale_rect(*spec) for name, spec in self.SPECS.items()}
+
+        # Date: month then two day digits
+        dc = rects['date_container']
+        unit_w = dc.width / 3.8
+        rects['date_month'] = pygame.Rect(dc.x, dc.y, int(unit_w * 2), dc.height)
+        rects['date_d0'] = pygame.Rect(dc.x + int(unit_w * 2), dc.y, int(unit_w * 0.9), dc.height)
+        rects['date_d1'] = pygame.Rect(dc.x + int(unit_w * 2.9), dc.y, int(unit_w * 0.9), dc.height)
+
+        # Clock digits laid out left to right, then AM/PM
+        dig_c = rects['digits_container']
+        unit_w = dig_c.width / 5.3
+        x_cursor = dig_c.x
+        for name, weight in (('digit_h0', 1), ('digit_h1', 1), ('colon', 0.3), ('digit_m0', 1), ('digit_m1', 1)):
+            w = int(unit_w * weight)
+            rects[name] = pygame.Rect(x_cursor, dig_c.y, w, dig_c.height)
+            x_cursor += w
+        rects['ampm'] = pygame.Rect(x_cursor, dig_c.y + dig_c.height//4, int(unit_w), dig_c.height//2)
+
+        # Set-mode buttons: 3 buttons spaced out
+        base = rects['controls_layout']
+        for i, name in enumerate(('ctrl_minus', 'ctrl_set', 'ctrl_plus')):
+            rects[name] = pygame.Rect(base.x + self.x(150 * i), base.y, self.x(100), self.y(100))
+
+        # Sound list: rows between the popup title and the Select button
+        popup = rects['popup_bg']
+        list_top = popup.y + self.y(70)
+        rects['sound_list'] = pygame.Rect(popup.x + self.x(20), list_top,
+                                          popup.width - self.x(40), rects['popup_select_btn'].y - list_top)
+        self.rects = rects
+
+        self.row_height = max(1, self.y(40))
+        self.row_box_height = self.y(35)
+        self.text_inset = self.x(10)
+        self.popup_title_y = popup.y + self.y(20)
+        self.warning_text_y = rects['warning_popup_bg'].y + self.y(80)
+        self.knob_size = (self.x(80), self.y(80))
+        self.font_size = max(12, self.y(32))
+
+    def x(self, value):
+        return int(round(value * self.sx))
+
+    def y(self, value):
+        return int(round(value * self.sy))
+
+    def scale_rect(self, x, y, w, h):
+        # Scale edges rather than sizes so adjacent rects stay adjacent
+        left, top = self.x(x), self.y(y)
+        return pygame.Rect(left, top, self.x(x + w) - left, self.y(y + h) - top)
+
+class GlyphAtlas:
+    """Clock-face glyphs pre-scaled to their layout slots and packed into one surface.
+
+    Built from (asset key, slot size) pairs; each glyph is scaled to fit its
+    slot the way draw_image_contain does, so blitting a sub-rect of the
+    atlas draws exactly what the individually scaled surface would.
+    """
+    PADDING = 1
+    MAX_WIDTH = 2048
+
+    def __init__(self, images, slots):
+        glyphs = []
+        for key, size in slots:
+            img = images.get(key)
+            if not img:
+                continue
+            iw, ih = img.get_size()
+            scale = min(size[0] / iw, size[1] / ih)
+            nw, nh = int(iw * scale), int(ih * scale)
+            if nw > 0 and nh > 0:
+                offset = ((size[0] - nw) // 2, (size[1] - nh) // 2)
+                glyphs.append(((key, tuple(size)), pygame.transform.smoothscale(img, (nw, nh)), offset))
+
+        # Shelf packing, tallest glyphs first
+        glyphs.sort(key=lambda g: -g[1].get_height())
+        x = y = shelf_h = width = 0
+        positions = []
+        for _, scaled, _ in glyphs:
+            w, h = scaled.get_size()
+            if x and x + w > self.MAX_WIDTH:
+                x, y, shelf_h = 0, y + shelf_h + self.PADDING, 0
+            positions.append((x, y))
+            x += w + self.PADDING
+            shelf_h = max(shelf_h, h)
+            width = max(width, x)
+
+        surface = pygame.Surface((max(1, width), max(1, y + shelf_h)), pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 0))
+        self.lookup = {}
+        for (slot_key, scaled, offset), pos in zip(glyphs, positions):
+            # MAX-blending onto transparent black copies the pixels, alpha included
+            surface.blit(scaled, pos, special_flags=pygame.BLEND_RGBA_MAX)
+            self.lookup[slot_key] = (pygame.Rect(pos, scaled.get_size()), offset)
+        self.surface = surface.convert_alpha()
+        self.alpha = 255
+
+    def blit(self, dest, key, rect, alpha=255):
+        """Draw glyph `key` centred in `rect`; False if the atlas has no such glyph."""
+        entry = self.lookup.get((key, rect.size))
+        if entry is None:
+            return False
+        if alpha == 0:
+            return True
+        if alpha != self.alpha:
+            self.surface.set_alpha(alpha)
+            self.alpha = alpha
+        area, (dx, dy) = entry
+        dest.blit(self.surface, (rect.x + dx, rect.y + dy), area)
+        return True
+
+    def stats(self):
+        w, h = self.surface.get_size()
+        return {
+            'glyphs': len(self.lookup),
+            'size': [w, h],
+            'bytes': w * h * self.surface.get_bytesize(),
+        }
+
+class HitGrid:
+    """Tap targets bucketed by coarse grid cell.
+
+    A tap only tests the few widgets whose rects overlap its cell, so lookup
+    cost does not grow with the number of widgets registered.
+    """
+
+    def __init__(self, cell=64):
+        self.cell = cell
+        self.buckets = {}
+
+    def add(self, rect, handler, enabled=None):
+        """Register handler(pos) for taps inside rect while enabled() is true."""
+        widget = (rect, handler, enabled)
+        c = self.cell
+        for cx in range(rect.left // c, (rect.right - 1) // c + 1):
+            for cy in range(rect.top // c, (rect.bottom - 1) // c + 1):
+                self.buckets.setdefault((cx, cy), []).append(widget)
+
+    def hit(self, pos):
+        for rect, handler, enabled in self.buckets.get((pos[0] // self.cell, pos[1] // self.cell), ()):
+            if rect.collidepoint(pos) and (enabled is None or enabled()):
+                return handler
+        return None
+
+class InputDispatcher:
+    """Routes taps through stacked layers of widgets, topmost active layer first.
+
+    A modal layer swallows taps that miss all of its widgets, so nothing
+    underneath a popup reacts to them.
+    """
+
+    def __init__(self):
+        self.layers = []
+
+    def add_layer(self, active=None, modal=False):
+        """Push a layer above the existing ones and return its HitGrid."""
+        grid = HitGrid()
+        self.layers.insert(0, (active, modal, grid))
+        return grid
+
+    def dispatch(self, pos):
+        for active, modal, grid in self.layers:
+            if active is not None and not active():
+                continue
+            handler = grid.hit(pos)
+            if handler:
+                handler(pos)
+                return True
+            if modal:
+                return False
+        return False
+
+class SharedAssets:
+    """Resources any number of clock views in one process can render from.
+
+    Decoded images, scaled surfaces, glyph atlases, fonts and rendered text,
+    overlays, decoded sounds and holiday data depend only on the asset files
+    and the display size, never on one clock's alarm or brightness, so they
+    are loaded once. Anything that depends on size is keyed by it.
+
+    Holidays come from `holidays` if given, e.g. a RuleBasedHolidays for an
+    offline run; otherwise a HolidayProvider is started, which fetches in
+    the background and caches next to the script.
+    """
+
+    def __init__(self, holidays=None):
+        # Single scan of assets/ shared by image and sound loading
+        self.asset_index = AssetIndex(os.path.join(BASE_DIR, 'assets'))
+        self.loader_pool = ThreadPoolExecutor(max_workers=4)
+        # Filled by the first view's load_assets()
+        self.assets = None
+        # Pre-scaled surfaces keyed by (asset key, width, height, opacity)
+        self.scaled_cache = {}
+        self.scaled_cache_hits = 0
+        self.scaled_cache_misses = 0
+        # Views drawing with these assets; their sizes decide what prune_sizes() keeps
+        self.views = weakref.WeakSet()
+        # Keyed by display size
+        self.glyph_atlases = {}
+        self.overlays = {}
+        # Keyed by font size
+        self.fonts = {}
+        self.text_caches = {}
+        self.sound_cache = SoundCache()
+        if holidays is None:
+            holidays = HolidayProvider(os.path.join(BASE_DIR, 'holidays_cache.json'))
+            holidays.start()
+        self.holidays = holidays
+
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            font = self.fonts[size] = pygame.font.SysFont(None, size)
+        return font
+
+    def text_cache(self, font_size):
+        # Rendered text surfaces keyed by (string, color), least recently used first
+        return self.text_caches.setdefault(font_size, OrderedDict())
+
+    def prune_sizes(self):
+        """Drop per-size entries no live view is drawing at any more."""
+        layouts = [view.layout for view in self.views]
+        sizes = {layout.size for layout in layouts}
+        font_sizes = {layout.font_size for layout in layouts}
+        for size in [s for s in self.glyph_atlases if s not in sizes]:
+            del self.glyph_atlases[size]
+        # Overlays are keyed by (kind, display size)
+        for key in [k for k in self.overlays if k[1] not in sizes]:
+            del self.overlays[key]
+        for font_size in [s for s in self.fonts if s not in font_sizes]:
+            del self.fonts[font_size]
+        for font_size in [s for s in self.text_caches if s not in font_sizes]:
+            del self.text_caches[font_size]
+
+def shared_property(name):
+    """Expose a SharedAssets attribute on the view as if it were its own."""
+    return property(lambda self: getattr(self.shared, name),
+                    lambda self, value: setattr(self.shared, name, value))
+
+def engine_property(name):
+    """Expose an AlarmEngine attribute on the view as if it were its own."""
+    return property(lambda self: getattr(self.engine, name),
+                    lambda self, value: setattr(self.engine, name, value))
+
+class AlarmClockApp:
+    # Alarm state lives in the engine; the view reads and writes it through these
+    alarm_set_time = engine_property('alarm_set_time')
+    alarm_active = engine_property('alarm_active')
+    previewing_alarm = engine_property('previewing_alarm')
+    brightness_level = engine_property('brightness_level')
+    day_brightness = engine_property('day_brightness')
+    night_brightness = engine_property('night_brightness')
+    schedule = engine_property('schedule')
+    alarm_sound = property(lambda self: self.audio.sound,
+                           lambda self, sound: setattr(self.audio, 'sound', sound))
+
+    # Assets and caches live in SharedAssets, possibly shared with other views
+    asset_index = shared_property('asset_index')
+    loader_pool = shared_property('loader_pool')
+    assets = shared_property('assets')
+    scaled_cache = shared_property('scaled_cache')
+    scaled_cache_hits = shared_property('scaled_cache_hits')
+    scaled_cache_misses = shared_property('scaled_cache_misses')
+    sound_cache = shared_property('sound_cache')
+    holidays = shared_property('holidays')
+
+    @property
+    def glyph_atlas(self):
+        return self.shared.glyph_atlases.get(self.layout.size)
+
+    @glyph_atlas.setter
+    def glyph_atlas(self, atlas):
+        if atlas is None:
+            self.shared.glyph_atlases.pop(self.layout.size, None)
+        else:
+            self.shared.glyph_atlases[self.layout.size] = atlas
+
+    # View methods timed individually when instrumentation is enabled
+    TIMED_METHODS = ('build_frame', 'draw', 'draw_image_contain', 'get_dim_overlay',
+                     'draw_sound_selection_popup', 'draw_warning_popup', 'render_text')
+
+    def __init__(self, clock=None, size=Layout.DESIGN_SIZE, shared=None, surface=None,
+                 settings_path=None, audio=None, holidays=None):
+        """Open a window, or with `surface` draw offscreen into it instead.
+
+        Views in one process can pass the same `shared` SharedAssets; each
+        then needs its own `settings_path` and, to ring independently, an
+        `audio` backend on its own mixer channel. Without `shared`,
+        `holidays` is handed to the SharedAssets built here.
+        """
         pygame.init()
-        self.width = 1280
-        self.height = 800
-        self.screen = pygame.display.set_mode((self.width, self.height))
-        pygame.display.set_caption("Alarm Clock")
+        if surface is None:
+            self.width, self.height = size
+            self.screen = pygame.display.set_mode((self.width, self.height), pygame.RESIZABLE)
+            pygame.display.set_caption("Alarm Clock")
+        else:
+            init_offscreen_display()
+            self.screen = surface
+            self.width, self.height = surface.get_size()
+        self.offscreen = surface is not None
+        self.shared = shared if shared is not None else SharedAssets(holidays)
+        # Cumulative hot-path counters, only ever bumped on cache misses
+        self.counters = {'scales': 0, 'text_renders': 0, 'surface_allocs': 0, 'sound_decodes': 0}
+        # Instrumentation, off unless enable_stats() is called
+        self.stats = None
+        self.stats_overlay = False
+        self.stats_overlay_surface = None
+        self.stats_overlay_refresh = 0
+        # Local control server, off unless enable_control() is called
+        self.control = None
+        # Called as on_change(app) after every change to persistent settings
+        self.on_change = None
+        # Input recorder, off unless enable_recording() is called
+        self.recorder = None
+        # Called as after_draw(screen, dirty rects) once a frame is drawn, before the stats overlay
+        self.after_draw = None
+        # Rects for the current display size; rebuilt only by apply_layout()
+        self.layout = Layout(self.screen.get_size())
+        self.input = self.build_input()
+        self.shared.views.add(self)
         
-        self.font = pygame.font.SysFont(None, 32)
+        self.font = self.shared.font(self.layout.font_size)
+        self.text_cache = self.shared.text_cache(self.layout.font_size)
+        self.text_cache_size = 256
+        # Alarm logic
+        if audio is None:
+            # Alarm and onset probe get reserved channels so previews never take them
+            audio = PygameAlarmAudio(*(reserve_channels(0, 2) or ()))
+        self.audio = audio
+        # A VirtualClock here drives update(), toggle_alarm and night mode from simulated time
+        self.engine = AlarmEngine(clock=clock, audio=self.audio, holidays=self.holidays)
+
         # State
-        now = datetime.now()
-        future = now + timedelta(minutes=1)
-        self.alarm_hour = future.hour
-        self.alarm_minute = future.minute
-        self.alarm_set_time = f"{self.alarm_hour:02d}:{self.alarm_minute:02d}"
+        # Alarm time being edited in set mode; committed to the engine by advance_stage
+        self.alarm_hour = self.engine.alarm_hour
+        self.alarm_minute = self.engine.alarm_minute
         
-        self.previewing_alarm = False
         self.is_setting_alarm = False
         self.is_setting_brightness = False
         self.showing_warning_popup = False
         self.warning_message = ""
-        self.holidays_cache = {}
         self.is_selecting_sound = False
+        # Index of the first visible row in the sound list
+        self.sound_list_scroll = 0
         self.sound_files = self.find_sound_files()
         self.active_alarm_file = 'alarm-digital.wav'
         self.selected_sound_file = self.active_alarm_file
         self.preview_sound_obj = None
-        self.brightness_level = 1.0
-        self.day_brightness = 1.0
-        self.night_brightness = 0.5
         self.setting_stage = 'hours' # 'hours' or 'minutes'
-        self.alarm_active = False
-        self.preview_end_time = 0
         
         # Slider dragging state
         self.dragging_slider = False
+        # Touch scrolling of the sound list: press position and scroll at the press,
+        # and whether the finger has moved far enough to scroll rather than select
+        self.sound_drag_start = None
+        self.sound_drag_scroll = 0
+        self.sound_drag_moved = False
 
-        # Asset Loading
-        self.assets = {}
-        self.load_assets()
-        self.alarm_sound = self.load_sound(self.active_alarm_file)
+        # Persistent settings
+        self.settings = SettingsStore(settings_path or os.path.join(BASE_DIR, 'settings.json'), clock=self.engine.clock)
+        values = self.settings.load()
+        self.active_alarm_file = values.get('active_alarm_file', self.active_alarm_file)
+        self.selected_sound_file = self.active_alarm_file
+        self.engine.apply_settings(values)
+        self.alarm_hour = self.engine.alarm_hour
+        self.alarm_minute = self.engine.alarm_minute
+        self.engine.on_change = self.save_settings
+
+        # Dirty-rectangle rendering: only changed elements are redrawn and pushed
+        self.dirty_rendering = True
+        self.last_frame = None
+
+        # Asset Loading (once per SharedAssets)
+        # Clock and date glyphs for the current layout are built once their assets are decoded
+        self.use_glyph_atlas = True
+        if self.assets is None:
+            self.load_assets()
+        # The alarm sound is decoded in the background; update() collects it
+        self.alarm_sound = None
+        self.pending_alarm_sound = self.loader_pool.submit(self.load_sound, self.active_alarm_file)
         
+    def enable_stats(self, overlay=False, log_path=None, log_interval=10.0, window=300):
+        """Collect frame timings in run(); optionally show them on screen and log them as JSON lines."""
+        self.stats = FrameStats(self.counters, window, log_path, log_interval)
+        for name in self.TIMED_METHODS:
+            self.stats.wrap(self, name)
+        self.stats_overlay = overlay
+
+    def enable_control(self, port=8765, host='127.0.0.1'):
+        """Serve the local control API (see alarm_control) while run() is running."""
+        from alarm_control import ControlServer
+        self.control = ControlServer([self], host, port)
+        self.control.start()
+        return self.control
+
+    def enable_recording(self, path):
+        """Record input and clock readings of every run() frame to `path` (see alarm_replay)."""
+        from alarm_replay import Recorder
+        self.recorder = Recorder(self, path)
+        return self.recorder
+
+    def save_settings(self):
+        values = self.engine.settings_values()
+        values['active_alarm_file'] = self.active_alarm_file
+        self.settings.save(values)
+        if self.on_change:
+            self.on_change(self)
+
     def find_sound_files(self):
-        files = []
-        assets_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
-        if os.path.exists(assets_dir):
-            for f in os.listdir(assets_dir):
-                if f.lower().endswith(('.mp3', '.wav')):
-                    files.append(f)
-        files.sort()
-        return files
+        self.asset_index.refresh()
+        return self.asset_index.sound_files()
         
     def fix_path(self, path):
         """Return the case-corrected path if file exists, else original."""
+        directory, filename = os.path.split(path)
+        if directory == self.asset_index.directory:
+            return self.asset_index.resolve(filename) or path
+
         if os.path.exists(path):
             return path
             
         # Try case-insensitive lookup
-        directory, filename = os.path.split(path)
         if not os.path.exists(directory):
             return path
             
@@ -77,24 +835,43 @@ class AlarmClockApp:
             return os.path.join(directory, actual_name)
         return path
 
-    def load_image(self, name):
-        path = self.fix_path(name)
+    def decode_image(self, name):
+        """Decode an image file without converting it; safe to call off the main thread."""
+        path = self.fix_path(os.path.join(BASE_DIR, name))
         try:
-            img = pygame.image.load(path).convert_alpha()
-            return img
+            return pygame.image.load(path)
         except Exception as e:
             print(f"Error loading {path}: {e}")
             return None
 
+    def load_image(self, name):
+        img = self.decode_image(name)
+        return img.convert_alpha() if img else None
+
     def load_sound(self, filename):
-        path = self.fix_path(os.path.join('assets', filename))
+        path = self.fix_path(os.path.join(BASE_DIR, 'assets', filename))
         try:
-            return pygame.mixer.Sound(path)
+            # Loader threads call this too; the cache counts decodes under its lock
+            return self.sound_cache.load(path, self.counters)
         except Exception as e:
             print(f"Error loading sound: {e}")
             return None
 
+    def first_screen_asset_keys(self):
+        """Assets the first clock frame needs: icons, current digits and month."""
+        time_str, ampm_str = self.engine.clock_strings
+        date_month, date_day = self.engine.date_strings
+        keys = {'sound_settings', 'set_alarm_inactive', 'brightness_off', 'alarm_off', ':'}
+        keys.update(time_str.replace(':', ''))
+        keys.update(date_day)
+        keys.add(ampm_str)
+        keys.add(date_month)
+        return keys
+
     def load_assets(self):
+        self.clear_scaled_cache()
+        self.shared.glyph_atlases.clear()
+        self.last_frame = None
         # Map characters to filenames
         chars = {
             '0': 'assets/zero.png', '1': 'assets/one.png', '2': 'assets/two.png',
@@ -102,8 +879,6 @@ class AlarmClockApp:
             '6': 'assets/six.png', '7': 'assets/seven.png', '8': 'assets/eight.png',
             '9': 'assets/nine.png', ':': 'assets/colon.png', '.': 'assets/dot.png'
         }
-        for k, v in chars.items():
-            self.assets[k] = self.load_image(v)
             
         # Other UI elements
         ui_files = {
@@ -122,183 +897,409 @@ class AlarmClockApp:
             'am': 'assets/am.png',
             'pm': 'assets/pm.png'
         }
-        for k, v in ui_files.items():
-            self.assets[k] = self.load_image(v)
             
         # Months
-        months = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
-        for m in months:
-            self.assets[m] = self.load_image(f'assets/{m}.png')
+        month_files = {m: f'assets/{m}.png' for m in MONTHS}
+
+        # Decode everything in the pool, first-screen assets first. Only those
+        # are waited for and converted now; the rest convert on first use.
+        files = {**chars, **ui_files, **month_files}
+        eager = self.first_screen_asset_keys()
+        self.assets = AssetStore()
+        for k in sorted(files, key=lambda k: k not in eager):
+            self.assets.defer(k, self.loader_pool.submit(self.decode_image, files[k]))
+        for k in eager:
+            self.assets.get(k)
+
+    def poll_pending_loads(self):
+        """Pick up the alarm sound once its background load has finished."""
+        if self.pending_alarm_sound and self.pending_alarm_sound.done():
+            self.alarm_sound = self.pending_alarm_sound.result()
+            self.pending_alarm_sound = None
+
+    def glyph_slots(self):
+        """(asset key, slot size) for every glyph the clock face and date can show."""
+        rects = self.layout.rects
+        digits = '0123456789'
+        slots = [(d, rects['date_d0'].size) for d in digits]
+        slots += [(d, rects['digit_h0'].size) for d in digits + '.']
+        slots.append((':', rects['colon'].size))
+        slots += [(k, rects['ampm'].size) for k in ('am', 'pm')]
+        slots += [(m, rects['date_month'].size) for m in MONTHS]
+        return slots
+
+    def ensure_glyph_atlas(self):
+        """Build the glyph atlas once every glyph asset has finished decoding.
+
+        Until then glyphs are drawn through the scaled cache, which renders
+        identically, so this never blocks on a pending decode.
+        """
+        if self.glyph_atlas is not None or not self.use_glyph_atlas:
+            return
+        slots = self.glyph_slots()
+        pending = self.assets.pending
+        if any(k in pending and not pending[k].done() for k, _ in slots):
+            return
+        start = time.perf_counter()
+        atlas = GlyphAtlas(self.assets, slots)
+        atlas.build_ms = (time.perf_counter() - start) * 1000
+        self.glyph_atlas = atlas
+        self.counters['scales'] += len(atlas.lookup)
+        self.counters['surface_allocs'] += len(atlas.lookup) + 2
+
+    def glyph_atlas_stats(self):
+        atlas = self.glyph_atlas
+        if atlas is None:
+            return None
+        return {**atlas.stats(), 'build_ms': atlas.build_ms}
+
+    def clear_scaled_cache(self):
+        """Drop all pre-scaled surfaces. Call when layout or assets change."""
+        self.scaled_cache.clear()
+
+    def scaled_cache_stats(self):
+        return {
+            'entries': len(self.scaled_cache),
+            'bytes': sum(s.get_width() * s.get_height() * s.get_bytesize() for s in self.scaled_cache.values()),
+            'hits': self.scaled_cache_hits,
+            'misses': self.scaled_cache_misses
+        }
+
+    def get_scaled(self, img_key, size, opacity=255):
+        """Return the asset scaled to exactly `size`, scaling only on a cache miss."""
+        key = (img_key, size[0], size[1], opacity)
+        scaled = self.scaled_cache.get(key)
+        if scaled is not None:
+            self.scaled_cache_hits += 1
+            return scaled
+
+        self.scaled_cache_misses += 1
+        self.counters['surface_allocs'] += 1
+        img = self.assets.get(img_key)
+        if img:
+            scaled = pygame.transform.smoothscale(img, size)
+            self.counters['scales'] += 1
+            if opacity < 255:
+                scaled.set_alpha(opacity)
+        else:
+            # Red placeholder for missing assets
+            scaled = pygame.Surface(size, pygame.SRCALPHA)
+            scaled.fill((255, 0, 0, 128))
+        self.scaled_cache[key] = scaled
+        return scaled
 
     def draw_image_contain(self, img_key, rect, opacity=255):
         img = self.assets.get(img_key)
         if not img:
-            # Draw red placeholder for missing assets
-            s = pygame.Surface((rect.width, rect.height), pygame.SRCALPHA)
-            s.fill((255, 0, 0, 128))
-            self.screen.blit(s, rect)
+            self.screen.blit(self.get_scaled(img_key, (rect.width, rect.height)), rect)
             return
 
         iw, ih = img.get_size()
         scale = min(rect.width / iw, rect.height / ih)
         nw, nh = int(iw * scale), int(ih * scale)
         
-        scaled = pygame.transform.smoothscale(img, (nw, nh))
-        if opacity < 255:
-            scaled.set_alpha(opacity)
+        scaled = self.get_scaled(img_key, (nw, nh), opacity)
             
         x = rect.x + (rect.width - nw) // 2
         y = rect.y + (rect.height - nh) // 2
         self.screen.blit(scaled, (x, y))
 
     def get_rects(self):
-        # Define layout areas based on original Kivy pos_hints
-        return {
-            'sound_settings': pygame.Rect(25, 16, 120, 100),
-            'settings': pygame.Rect(166, 16, 120, 100),
-            'brightness': pygame.Rect(307, 16, 120, 100),
-            'date_container': pygame.Rect(1280 - 300 - 25, 16, 300, 80),
-            'digits_container': pygame.Rect(128, 200, 1024, 320),
-            'alarm_btn': pygame.Rect(515, 520, 250, 200),
-            'controls_layout': pygame.Rect(440, 520, 400, 100),
-            'brightness_container': pygame.Rect(390, 560, 500, 80),
-            # Popup Rects
-            'popup_bg': pygame.Rect(340, 150, 600, 500),
-            'popup_select_btn': pygame.Rect(340 + 240, 150 + 430, 120, 50),
-            'warning_popup_bg': pygame.Rect(340, 250, 600, 300),
-            'warning_yes': pygame.Rect(340 + 100, 250 + 200, 150, 60),
-            'warning_no': pygame.Rect(340 + 350, 250 + 200, 150, 60)
-        }
+        # Precomputed for the current display size; treat as read-only
+        return self.layout.rects
+
+    def apply_layout(self):
+        """Recompute the layout for the current display size.
+
+        Scaled assets and the last frame used for dirty rendering are
+        dropped. Fonts, text, overlays and the glyph atlas are kept per size
+        in SharedAssets: the new size's are looked up again, and the old
+        size's are dropped unless another view sharing them still uses it.
+        """
+        self.width, self.height = self.screen.get_size()
+        self.layout = Layout((self.width, self.height))
+        self.input = self.build_input()
+        self.font = self.shared.font(self.layout.font_size)
+        self.text_cache = self.shared.text_cache(self.layout.font_size)
+        self.shared.prune_sizes()
+        self.clear_scaled_cache()
+        self.last_frame = None
+        # Fewer rows may fit now
+        self.scroll_sound_list(0)
+
+    def resize(self, size):
+        if tuple(size) == self.layout.size:
+            return
+        if self.offscreen:
+            self.screen = pygame.Surface(size, 0, self.screen)
+        else:
+            self.screen = pygame.display.set_mode(size, pygame.RESIZABLE)
+        self.apply_layout()
+
+    def seconds_until_next_change(self):
+        """Seconds until anything visible on screen changes on its own.
+
+        Returns 0 while the brightness slider is being dragged so the loop
+        renders at full rate.
+        """
+        if self.dragging_slider or self.sound_drag_start or (self.control and self.control.pending()):
+            return 0
+
+        now = self.engine.clock.now()
+        mono = self.engine.clock.monotonic()
+        # Minute rollover, preview end and the next alarm
+        candidates = [self.engine.seconds_until_next_event()]
+
+        # Digit blink in setting mode, colon blink in clock mode
+        if self.is_setting_alarm:
+            candidates.append(0.5 - (mono % 0.5))
+        elif not self.previewing_alarm:
+            candidates.append(0.5 - (now.microsecond / 1e6) % 0.5)
+
+        flush_at = self.settings.flush_deadline()
+        if flush_at is not None:
+            candidates.append(flush_at - mono)
+
+        return max(0, min(candidates))
 
     def run(self):
         clock = pygame.time.Clock()
         running = True
         
         while running:
-            # Event Handling
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    self.handle_click(event.pos)
-                elif event.type == pygame.MOUSEBUTTONUP:
-                    self.dragging_slider = False
-                elif event.type == pygame.MOUSEMOTION:
-                    if self.dragging_slider:
-                        self.update_brightness_drag(event.pos)
-
-            # Update Logic
-            self.update()
-            
-            # Drawing
-            self.draw()
-            
-            pygame.display.flip()
-            clock.tick(30)
+            # Block until the next visible change or input, whichever comes first
+            delay = self.seconds_until_next_change()
+            if delay > 0:
+                # Pad the timeout so we wake just after the boundary, not just before it
+                first = pygame.event.wait(int(delay * 1000) + 5)
+                events = [] if first.type == pygame.NOEVENT else [first]
+                events.extend(pygame.event.get())
+            else:
+                clock.tick(30)
+                events = pygame.event.get()
+
+            recorder = self.recorder
+            if recorder:
+                recorder.begin_frame(events)
+            running = self.run_frame(events)
+            if recorder:
+                recorder.end_frame()
             
+        if self.recorder:
+            self.recorder.close()
+        if self.control:
+            self.control.stop()
+        self.settings.flush()
         pygame.quit()
 
-    def handle_click(self, pos):
-        rects = self.get_rects()
-        
-        if self.showing_warning_popup:
-            self.handle_warning_popup_click(pos)
-            return
+    def run_frame(self, events):
+        """Handle one frame's events, update and redraw; returns False once the window is closed.
 
-        if self.is_selecting_sound:
-            self.handle_sound_selection_click(pos)
-            return
-        
-        # Sound Settings Button (New)
-        if rects['sound_settings'].collidepoint(pos):
-            self.is_selecting_sound = True
-            self.selected_sound_file = self.active_alarm_file
-        
-        # Settings Button
-        elif rects['settings'].collidepoint(pos):
-            if not self.is_setting_alarm:
-                self.enter_set_mode()
+        An offscreen view draws but leaves the display alone.
+        """
+        running = True
+        # Idle waiting before the frame is not part of it
+        stats = self.stats
+        if stats:
+            stats.begin_frame()
+
+        # Requests from the control server, within its per-frame budget
+        if self.control:
+            self.control.poll()
+
+        # Event Handling
+        # Drag motion arrives in bursts; only the latest position per frame is applied
+        drag_pos = None
+        for event in events:
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                self.handle_click(event.pos)
+            elif event.type == pygame.MOUSEBUTTONUP:
+                if drag_pos:
+                    self.update_drag(drag_pos)
+                    drag_pos = None
+                self.handle_release(event.pos)
+            elif event.type == pygame.MOUSEMOTION:
+                if self.dragging_slider or self.sound_drag_start:
+                    drag_pos = event.pos
+            elif event.type == pygame.VIDEORESIZE:
+                self.resize(event.size)
+            elif event.type == pygame.MOUSEWHEEL:
+                if self.is_selecting_sound:
+                    self.scroll_sound_list(-event.y)
+        if drag_pos:
+            self.update_drag(drag_pos)
+        if stats:
+            stats.phase('events')
+
+        # Update Logic
+        self.update()
+        if stats:
+            stats.phase('update')
         
-        # Brightness Button
-        elif rects['brightness'].collidepoint(pos):
-            self.toggle_brightness_mode()
-            
-        # Alarm Toggle (only if not setting)
-        elif not self.is_setting_alarm and not self.is_setting_brightness:
-            if rects['alarm_btn'].collidepoint(pos):
-                self.toggle_alarm()
-                
+        # Drawing
+        if self.dirty_rendering:
+            dirty = self.draw_dirty()
+            if stats:
+                stats.phase('draw')
+            if self.after_draw:
+                self.after_draw(self.screen, dirty)
+            if self.stats_overlay:
+                dirty.extend(self.draw_stats_overlay(force=bool(dirty)))
+                stats.phase('overlay')
+            if dirty and not self.offscreen:
+                pygame.display.update(dirty)
+        else:
+            self.draw()
+            if stats:
+                stats.phase('draw')
+            if self.after_draw:
+                self.after_draw(self.screen, [self.screen.get_rect()])
+            if self.stats_overlay:
+                self.draw_stats_overlay(force=True)
+                stats.phase('overlay')
+            if not self.offscreen:
+                pygame.display.flip()
+        if stats:
+            stats.phase('flip')
+            stats.end_frame()
+        return running
+
+    def build_input(self):
+        """Register tap targets for the current layout, one layer per screen."""
+        rects = self.layout.rects
+        dispatcher = InputDispatcher()
+
+        main = dispatcher.add_layer()
+        main.add(rects['sound_settings'], lambda pos: self.open_sound_popup())
+        main.add(rects['settings'], lambda pos: self.enter_set_mode(),
+                 lambda: not self.is_setting_alarm)
+        main.add(rects['brightness'], lambda pos: self.toggle_brightness_mode())
+        # Alarm toggle (only if not setting)
+        main.add(rects['alarm_btn'], lambda pos: self.toggle_alarm(),
+                 lambda: not self.is_setting_alarm and not self.is_setting_brightness)
         # Controls (only if setting alarm)
-        elif self.is_setting_alarm:
-            base = rects['controls_layout']
-            # 3 buttons spaced out
-            r_minus = pygame.Rect(base.x, base.y, 100, 100)
-            r_set = pygame.Rect(base.x + 150, base.y, 100, 100)
-            r_plus = pygame.Rect(base.x + 300, base.y, 100, 100)
-            
-            if r_minus.collidepoint(pos):
-                self.adjust_time(-1)
-            elif r_set.collidepoint(pos):
-                self.advance_stage()
-            elif r_plus.collidepoint(pos):
-                self.adjust_time(1)
-                
-        # Brightness Slider (only if setting brightness)
-        elif self.is_setting_brightness:
-            if rects['brightness_container'].collidepoint(pos):
-                self.dragging_slider = True
-                self.update_brightness_drag(pos)
+        setting = lambda: self.is_setting_alarm
+        main.add(rects['ctrl_minus'], lambda pos: self.adjust_time(-1), setting)
+        main.add(rects['ctrl_set'], lambda pos: self.advance_stage(), setting)
+        main.add(rects['ctrl_plus'], lambda pos: self.adjust_time(1), setting)
+        # Brightness slider (only if setting brightness)
+        main.add(rects['brightness_container'], self.start_brightness_drag,
+                 lambda: self.is_setting_brightness and not self.is_setting_alarm)
 
-    def handle_sound_selection_click(self, pos):
-        rects = self.get_rects()
-        popup = rects['popup_bg']
-        
-        # Check Select Button
-        if rects['popup_select_btn'].collidepoint(pos):
-            if self.preview_sound_obj:
-                self.preview_sound_obj.stop()
-            self.active_alarm_file = self.selected_sound_file
-            self.alarm_sound = self.load_sound(self.active_alarm_file)
-            self.is_selecting_sound = False
+        sound = dispatcher.add_layer(lambda: self.is_selecting_sound, modal=True)
+        sound.add(rects['popup_select_btn'], lambda pos: self.confirm_sound_selection())
+        sound.add(rects['sound_list'], self.start_sound_drag)
+
+        warning = dispatcher.add_layer(lambda: self.showing_warning_popup, modal=True)
+        warning.add(rects['warning_yes'], lambda pos: self.answer_warning(True))
+        warning.add(rects['warning_no'], lambda pos: self.answer_warning(False))
+        return dispatcher
+
+    def handle_click(self, pos):
+        self.input.dispatch(pos)
+
+    def handle_release(self, pos):
+        self.dragging_slider = False
+        if self.sound_drag_start:
+            self.end_sound_drag()
+
+    def update_drag(self, pos):
+        if self.dragging_slider:
+            self.update_brightness_drag(pos)
+        elif self.sound_drag_start:
+            self.update_sound_drag(pos)
+
+    def open_sound_popup(self):
+        self.is_selecting_sound = True
+        self.selected_sound_file = self.active_alarm_file
+        # Pick up sound files added since startup
+        self.sound_files = self.find_sound_files()
+        self.sound_list_scroll = 0
+        if self.selected_sound_file in self.sound_files:
+            self.scroll_sound_list(self.sound_files.index(self.selected_sound_file) - self.sound_list_capacity() + 1)
+
+    def confirm_sound_selection(self):
+        if self.preview_sound_obj:
+            self.preview_sound_obj.stop()
+        self.active_alarm_file = self.selected_sound_file
+        self.pending_alarm_sound = None
+        self.engine.stop_alarm_sound()
+        self.alarm_sound = self.load_sound(self.active_alarm_file)
+        self.is_selecting_sound = False
+        self.save_settings()
+
+    def set_alarm_file(self, filename):
+        """Make `filename` the alarm sound without the popup; it is decoded in the background."""
+        self.active_alarm_file = filename
+        if not self.is_selecting_sound:
+            self.selected_sound_file = filename
+        self.engine.stop_alarm_sound()
+        self.pending_alarm_sound = self.loader_pool.submit(self.load_sound, filename)
+        self.save_settings()
+
+    def select_sound_at(self, pos):
+        """Preview the sound in the list row under pos; rows are found by arithmetic."""
+        list_rect = self.layout.rects['sound_list']
+        row, offset = divmod(pos[1] - list_rect.y, self.layout.row_height)
+        if offset >= self.layout.row_box_height:
+            return  # gap between rows
+        first, last = self.visible_sound_rows()
+        if first + row >= last:
             return
+        f = self.sound_files[first + row]
+        self.selected_sound_file = f
+        if self.preview_sound_obj:
+            self.preview_sound_obj.stop()
+        self.preview_sound_obj = self.load_sound(f)
+        if self.preview_sound_obj:
+            self.preview_sound_obj.play(-1)
 
-        # Check List Items
-        list_start_y = popup.y + 70
-        for i, f in enumerate(self.sound_files):
-            item_rect = pygame.Rect(popup.x + 20, list_start_y + (i * 40), popup.width - 40, 35)
-            if item_rect.collidepoint(pos):
-                self.selected_sound_file = f
-                if self.preview_sound_obj:
-                    self.preview_sound_obj.stop()
-                self.preview_sound_obj = self.load_sound(f)
-                if self.preview_sound_obj:
-                    self.preview_sound_obj.play(-1)
-
-    def handle_warning_popup_click(self, pos):
-        rects = self.get_rects()
-        if rects['warning_yes'].collidepoint(pos):
+    def answer_warning(self, activate):
+        # Cancelling leaves the alarm off
+        if activate:
             self.activate_alarm()
-            self.showing_warning_popup = False
-        elif rects['warning_no'].collidepoint(pos):
-            # Cancel activation
-            self.showing_warning_popup = False
-            # Alarm remains off
+        self.showing_warning_popup = False
+
+    def start_sound_drag(self, pos):
+        """Press in the sound list: a release in place selects the row, a drag scrolls the list."""
+        self.sound_drag_start = pos
+        self.sound_drag_scroll = self.sound_list_scroll
+        self.sound_drag_moved = False
+
+    def update_sound_drag(self, pos):
+        dy = self.sound_drag_start[1] - pos[1]
+        row_height = self.layout.row_height
+        if not self.sound_drag_moved and abs(dy) < row_height // 2:
+            return  # still a tap
+        self.sound_drag_moved = True
+        # The list follows the finger a whole row at a time
+        target = self.sound_drag_scroll + round(dy / row_height)
+        self.scroll_sound_list(target - self.sound_list_scroll)
+
+    def end_sound_drag(self):
+        if not self.sound_drag_moved:
+            self.select_sound_at(self.sound_drag_start)
+        self.sound_drag_start = None
+        self.sound_drag_moved = False
+
+    def start_brightness_drag(self, pos):
+        self.dragging_slider = True
+        self.update_brightness_drag(pos)
 
     def update_brightness_drag(self, pos):
         rects = self.get_rects()
         container = rects['brightness_container']
-        knob_w = 80
+        knob_w = self.layout.knob_size[0]
         track_w = container.width
         travel = track_w - knob_w
         
         rel_x = pos[0] - (container.x + knob_w/2)
         pct = rel_x / travel if travel > 0 else 0
         val = max(0.1, min(1.0, pct))
-        if self.is_night_mode():
-            self.night_brightness = val
-        else:
-            self.day_brightness = val
-        self.brightness_level = val
+        # Saving is debounced: a drag writes once after the knob settles
+        self.engine.set_brightness(val)
 
     def toggle_brightness_mode(self):
         self.is_setting_brightness = not self.is_setting_brightness
@@ -329,115 +1330,58 @@ class AlarmClockApp:
         else:
             # Exit Set Mode
             self.is_setting_alarm = False
-            self.alarm_set_time = f"{self.alarm_hour:02d}:{self.alarm_minute:02d}"
+            self.engine.set_alarm_time(self.alarm_hour, self.alarm_minute)
 
     def toggle_alarm(self):
-        # If alarm is currently ON, turn it OFF immediately
-        if self.alarm_active:
-            self.alarm_active = False
-            self.previewing_alarm = False
-            return
-
-        # If turning ON, check for Weekend/Holiday warnings
-        now = datetime.now()
-        # Construct alarm time for today to compare
-        alarm_time_today = now.replace(hour=self.alarm_hour, minute=self.alarm_minute, second=0, microsecond=0)
-        
-        is_tomorrow = alarm_time_today <= now
-        
-        if is_tomorrow:
-            target_date = now.date() + timedelta(days=1)
-        else:
-            target_date = now.date()
-
-        # Check 1: Is the target date Saturday (5) or Sunday (6)?
-        is_weekend_setup = target_date.weekday() in [5, 6]
-        
-        # Check 2: Is the target date a federal holiday?
-        is_holiday = self.is_federal_holiday(target_date)
-        
-        if is_weekend_setup or is_holiday:
-            reasons = []
-            if is_weekend_setup: reasons.append("Weekend")
-            if is_holiday: reasons.append("Holiday")
-            self.warning_message = f"Alarm for {' & '.join(reasons)}. Continue?"
+        warning = self.engine.toggle_alarm()
+        if warning:
+            self.warning_message = warning
             self.showing_warning_popup = True
-            return
-
-        # If no warning needed, activate immediately
-        self.activate_alarm()
 
     def activate_alarm(self):
-        self.alarm_active = True
-        self.previewing_alarm = True
-        self.preview_end_time = time.time() + 2
+        self.engine.activate_alarm()
 
     def is_federal_holiday(self, date_obj):
-        year = date_obj.year
-        if year not in self.holidays_cache:
-            try:
-                # Fetch US holidays for the year
-                url = f"https://date.nager.at/api/v3/PublicHolidays/{year}/US"
-                with urllib.request.urlopen(url, timeout=3) as response:
-                    data = json.loads(response.read().decode())
-                    self.holidays_cache[year] = {d['date'] for d in data}
-            except Exception as e:
-                print(f"Could not fetch holidays: {e}")
-                self.holidays_cache[year] = set()
-        
-        return date_obj.strftime("%Y-%m-%d") in self.holidays_cache[year]
+        return self.engine.is_federal_holiday(date_obj)
 
     def is_night_mode(self):
-        h = datetime.now().hour
-        return h >= 23 or h < 7
+        return self.engine.is_night_mode()
 
     def update(self):
-        # Sync brightness based on time
-        if self.is_night_mode():
-            self.brightness_level = self.night_brightness
-        else:
-            self.brightness_level = self.day_brightness
+        self.poll_pending_loads()
+        self.ensure_glyph_atlas()
+        self.engine.update()
+        self.settings.flush_if_due(self.engine.frame_mono)
 
-        if self.previewing_alarm and time.time() > self.preview_end_time:
-            if self.alarm_active:
-                self.previewing_alarm = False
-        
-        # Check alarm trigger
-        if self.alarm_active:
-            now = datetime.now()
-            if now.hour == self.alarm_hour and now.minute == self.alarm_minute:
-                if self.alarm_sound and self.alarm_sound.get_num_channels() == 0:
-                    self.alarm_sound.play(-1)
-            elif self.alarm_sound:
-                self.alarm_sound.stop()
-        elif self.alarm_sound:
-            self.alarm_sound.stop()
-
-    def draw(self):
-        self.screen.fill((0, 0, 0))
+    def build_frame(self):
+        """Describe the current frame as named UI elements.
+
+        Each element maps to (bounding rect, draw items), where a draw item is
+        (kind, asset key, rect, alpha) and kind is 'contain', 'stretch' or
+        'glyph' (drawn from the glyph atlas). Anything that affects the whole
+        screen (overlay, popups) goes into 'global'.
+        """
         rects = self.get_rects()
+        elements = {}
         
         # 1. Sound Settings Button (New)
-        self.draw_image_contain('sound_settings', rects['sound_settings'])
+        elements['sound_settings'] = (rects['sound_settings'], (('contain', 'sound_settings', rects['sound_settings'], 255),))
 
         # 2. Settings Button (Alarm Time)
         icon = 'set_alarm' if self.is_setting_alarm else 'set_alarm_inactive'
-        self.draw_image_contain(icon, rects['settings'])
+        elements['settings'] = (rects['settings'], (('contain', icon, rects['settings'], 255),))
         
         # 3. Brightness Button
         icon = 'brightness' if self.is_setting_brightness else 'brightness_off'
-        self.draw_image_contain(icon, rects['brightness'])
+        elements['brightness'] = (rects['brightness'], (('contain', icon, rects['brightness'], 255),))
         
         # 4. Determine Time to Show
-        now = datetime.now()
-        blink_on = (int(time.time() * 2) % 2) == 0
+        engine = self.engine
+        blink_on = (int(engine.frame_mono * 2) % 2) == 0
+        date_month, date_day = engine.date_strings
         
         if self.is_setting_alarm:
-            dt_temp = datetime(2000, 1, 1, self.alarm_hour, self.alarm_minute)
-            time_str = dt_temp.strftime("%I:%M")
-            ampm_str = dt_temp.strftime("%p").lower()
-            date_month = now.strftime("%b").lower()
-            date_day = now.strftime("%d")
+            time_str, ampm_str = format_clock(self.alarm_hour, self.alarm_minute)
             
             h_alpha = 255 if (self.setting_stage != 'hours' or blink_on) else 76
             m_alpha = 255 if (self.setting_stage != 'minutes' or blink_on) else 76
@@ -446,89 +1390,84 @@ class AlarmClockApp:
         elif self.previewing_alarm:
             try:
                 h, m = map(int, self.alarm_set_time.split(':'))
-                dt_temp = datetime(2000, 1, 1, h, m)
-                time_str = dt_temp.strftime("%I:%M")
-                ampm_str = dt_temp.strftime("%p").lower()
+                time_str, ampm_str = format_clock(h, m)
             except:
                 time_str = self.alarm_set_time
                 ampm_str = "am"
-            date_month = now.strftime("%b").lower()
-            date_day = now.strftime("%d")
             h_alpha = m_alpha = colon_alpha = 255
             
         else:
-            time_str = now.strftime("%I:%M")
-            ampm_str = now.strftime("%p").lower()
-            date_month = now.strftime("%b").lower()
-            date_day = now.strftime("%d")
+            time_str, ampm_str = engine.clock_strings
             h_alpha = m_alpha = 255
-            colon_alpha = 255 if (time.time() % 1) < 0.5 else 0
+            # Colon stays in phase with the wall-clock second
+            colon_alpha = 255 if engine.frame_now.microsecond < 500000 else 0
 
-        # 5. Draw Date
-        dc = rects['date_container']
-        unit_w = dc.width / 3.8
-        r_month = pygame.Rect(dc.x, dc.y, int(unit_w * 2), dc.height)
-        r_d0 = pygame.Rect(dc.x + int(unit_w * 2), dc.y, int(unit_w * 0.9), dc.height)
-        r_d1 = pygame.Rect(dc.x + int(unit_w * 2.9), dc.y, int(unit_w * 0.9), dc.height)
-        
-        self.draw_image_contain(date_month, r_month)
-        self.draw_image_contain(date_day[0], r_d0)
-        self.draw_image_contain(date_day[1], r_d1)
-        
-        # 6. Draw Clock Digits
-        dig_c = rects['digits_container']
-        unit_w = dig_c.width / 5.3
-        x_cursor = dig_c.x
-        
-        def draw_digit(char, width_weight, alpha):
-            nonlocal x_cursor
-            w = int(unit_w * width_weight)
-            r = pygame.Rect(x_cursor, dig_c.y, w, dig_c.height)
-            self.draw_image_contain(char, r, alpha)
-            x_cursor += w
-            
-        draw_digit(time_str[0], 1, h_alpha)
-        draw_digit(time_str[1], 1, h_alpha)
-        draw_digit(':', 0.3, colon_alpha)
-        draw_digit(time_str[3], 1, m_alpha)
-        draw_digit(time_str[4], 1, m_alpha)
-        
-        r_ampm = pygame.Rect(x_cursor, dig_c.y + dig_c.height//4, int(unit_w), dig_c.height//2)
-        self.draw_image_contain(ampm_str, r_ampm)
+        # 5. Date and 6. Clock Digits, in their precomputed slots
+        for name, key, alpha in (
+            ('date_month', date_month, 255),
+            ('date_d0', date_day[0], 255),
+            ('date_d1', date_day[1], 255),
+            ('digit_h0', time_str[0], h_alpha),
+            ('digit_h1', time_str[1], h_alpha),
+            ('colon', ':', colon_alpha),
+            ('digit_m0', time_str[3], m_alpha),
+            ('digit_m1', time_str[4], m_alpha),
+            ('ampm', ampm_str, 255),
+        ):
+            r = rects[name]
+            elements[name] = (r, (('glyph', key, r, alpha),))
 
         # 7. Bottom Controls
         if self.is_setting_alarm:
-            base = rects['controls_layout']
-            self.draw_image_contain('minus', pygame.Rect(base.x, base.y, 100, 100))
-            self.draw_image_contain('set', pygame.Rect(base.x + 150, base.y, 100, 100))
-            self.draw_image_contain('plus', pygame.Rect(base.x + 300, base.y, 100, 100))
+            elements['controls'] = (rects['controls_layout'], (
+                ('contain', 'minus', rects['ctrl_minus'], 255),
+                ('contain', 'set', rects['ctrl_set'], 255),
+                ('contain', 'plus', rects['ctrl_plus'], 255)
+            ))
             
         elif self.is_setting_brightness:
             bc = rects['brightness_container']
             # Stretch slider track to fill container so button aligns with ends
-            track_img = self.assets.get('slider_track')
-            if track_img:
-                scaled = pygame.transform.smoothscale(track_img, (bc.width, bc.height))
-                self.screen.blit(scaled, bc)
-            else:
-                self.draw_image_contain('slider_track', bc)
-            knob_w = 80
+            track_kind = 'stretch' if self.assets.get('slider_track') else 'contain'
+            knob_w, knob_h = self.layout.knob_size
             travel = bc.width - knob_w
             knob_x = bc.x + (travel * self.brightness_level)
-            r_knob = pygame.Rect(knob_x, bc.y, knob_w, 80)
-            self.draw_image_contain('slider_knob', r_knob)
+            r_knob = pygame.Rect(knob_x, bc.y, knob_w, knob_h)
+            elements['controls'] = (bc, (
+                (track_kind, 'slider_track', bc, 255),
+                ('contain', 'slider_knob', r_knob, 255)
+            ))
             
         else:
             icon = 'alarm_on' if self.alarm_active else 'alarm_off'
-            self.draw_image_contain(icon, rects['alarm_btn'])
+            elements['controls'] = (rects['alarm_btn'], (('contain', icon, rects['alarm_btn'], 255),))
+
+        global_state = (
+            self.brightness_level,
+            self.is_selecting_sound, self.selected_sound_file, self.sound_list_scroll, len(self.sound_files),
+            tuple(self.sound_files[slice(*self.visible_sound_rows())]) if self.is_selecting_sound else (),
+            self.showing_warning_popup, self.warning_message
+        )
+        return {'global': global_state, 'elements': elements}
+
+    def draw(self, frame=None):
+        if frame is None:
+            frame = self.build_frame()
+        self.screen.fill((0, 0, 0))
+        atlas = self.glyph_atlas
+
+        for _, items in frame['elements'].values():
+            for kind, key, rect, alpha in items:
+                if kind == 'stretch':
+                    self.screen.blit(self.get_scaled(key, (rect.width, rect.height), alpha), rect)
+                elif kind == 'glyph' and atlas is not None and atlas.blit(self.screen, key, rect, alpha):
+                    continue
+                else:
+                    self.draw_image_contain(key, rect, alpha)
 
         # 8. Brightness Overlay
         if self.brightness_level < 1.0:
-            overlay = pygame.Surface((self.width, self.height))
-            overlay.fill((0, 0, 0))
-            alpha = int((1.0 - self.brightness_level) * 255)
-            overlay.set_alpha(alpha)
-            self.screen.blit(overlay, (0, 0))
+            self.screen.blit(self.get_dim_overlay(), (0, 0))
 
         # 9. Sound Selection Popup
         if self.is_selecting_sound:
@@ -537,36 +1476,144 @@ class AlarmClockApp:
         if self.showing_warning_popup:
             self.draw_warning_popup()
 
+    def get_dim_overlay(self):
+        """Reusable full-screen black overlay, re-alphaed only when brightness changes."""
+        key = ('dim', self.screen.get_size())
+        overlay = self.shared.overlays.get(key)
+        if overlay is None:
+            overlay = self.shared.overlays[key] = pygame.Surface(key[1]).convert()
+            self.counters['surface_allocs'] += 1
+            overlay.fill((0, 0, 0))
+
+        # Shared between views, so the alpha may be another clock's brightness
+        alpha = int((1.0 - self.brightness_level) * 255)
+        if alpha != overlay.get_alpha():
+            overlay.set_alpha(alpha)
+        return overlay
+
+    def draw_dirty(self):
+        """Redraw only the elements whose visual state changed since the last call.
+
+        Returns the list of screen rects that were touched, suitable for
+        pygame.display.update(). An empty list means nothing needs pushing.
+        """
+        frame = self.build_frame()
+        last = self.last_frame
+        self.last_frame = frame
+
+        if last is None or last['global'] != frame['global'] or last['elements'].keys() != frame['elements'].keys():
+            self.draw(frame)
+            return [self.screen.get_rect()]
+
+        dirty = []
+        for name, (rect, items) in frame['elements'].items():
+            old_rect, old_items = last['elements'][name]
+            if old_items != items:
+                dirty.append(rect)
+                if old_rect != rect:
+                    dirty.append(old_rect)
+        if not dirty:
+            return []
+
+        # Overlapping elements are handled by redrawing the whole frame clipped to each dirty rect
+        for rect in dirty:
+            self.screen.set_clip(rect)
+            self.draw(frame)
+        self.screen.set_clip(None)
+        return dirty
+
+    def draw_stats_overlay(self, force=False):
+        """Frame timings along the bottom edge, re-rendered once a second.
+
+        Returns the rect drawn, as a list for display.update(), or an empty
+        list if neither the text changed nor force was given.
+        """
+        refresh = self.engine.frame_mono >= self.stats_overlay_refresh
+        if not (refresh or force):
+            return []
+        if refresh or self.stats_overlay_surface is None:
+            self.stats_overlay_refresh = self.engine.frame_mono + 1.0
+            s = self.stats.summary()
+            if s['frames']:
+                phases = ' '.join(f"{k} {v:.2f}" for k, v in s['phases_ms'].items())
+                counts = ' '.join(f"{k} {v:.1f}" for k, v in s['counters_per_frame'].items())
+                text = f"p50 {s['p50_ms']:.1f}ms p99 {s['p99_ms']:.1f}ms | {phases} | {counts}"
+            else:
+                text = "no frames yet"
+            # Rendered directly so the overlay neither uses nor counts against the text cache
+            self.stats_overlay_surface = self.font.render(text, True, (0, 255, 0), (0, 0, 0))
+
+        h = self.stats_overlay_surface.get_height()
+        rect = pygame.Rect(0, self.height - h, self.width, h)
+        self.screen.fill((0, 0, 0), rect)
+        self.screen.blit(self.stats_overlay_surface, rect)
+        return [rect]
+
+    def render_text(self, text, color):
+        key = (text, color)
+        txt = self.text_cache.get(key)
+        if txt is not None:
+            self.text_cache.move_to_end(key)
+            return txt
+        txt = self.font.render(text, True, color)
+        self.counters['text_renders'] += 1
+        self.counters['surface_allocs'] += 1
+        self.text_cache[key] = txt
+        if len(self.text_cache) > self.text_cache_size:
+            self.text_cache.popitem(last=False)
+        return txt
+
+    def get_popup_backdrop(self):
+        key = ('popup', self.screen.get_size())
+        backdrop = self.shared.overlays.get(key)
+        if backdrop is None:
+            backdrop = self.shared.overlays[key] = pygame.Surface(key[1], pygame.SRCALPHA)
+            self.counters['surface_allocs'] += 1
+            backdrop.fill((0, 0, 0, 200))
+        return backdrop
+
+    def sound_list_capacity(self):
+        return max(1, self.layout.rects['sound_list'].height // self.layout.row_height)
+
+    def visible_sound_rows(self):
+        """(first, last) slice of sound_files currently shown in the popup."""
+        first = self.sound_list_scroll
+        return first, min(len(self.sound_files), first + self.sound_list_capacity())
+
+    def scroll_sound_list(self, rows):
+        max_scroll = max(0, len(self.sound_files) - self.sound_list_capacity())
+        self.sound_list_scroll = max(0, min(max_scroll, self.sound_list_scroll + rows))
+
     def draw_sound_selection_popup(self):
         rects = self.get_rects()
         popup = rects['popup_bg']
         
         # Overlay
-        s = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
-        s.fill((0, 0, 0, 200))
-        self.screen.blit(s, (0, 0))
+        self.screen.blit(self.get_popup_backdrop(), (0, 0))
         
         # Popup Box
         pygame.draw.rect(self.screen, (40, 40, 40), popup)
         pygame.draw.rect(self.screen, (200, 200, 200), popup, 2)
         
         # Title
-        title = self.font.render("Select Alarm Sound", True, (255, 255, 255))
-        self.screen.blit(title, (popup.centerx - title.get_width() // 2, popup.y + 20))
+        title = self.render_text("Select Alarm Sound", (255, 255, 255))
+        self.screen.blit(title, (popup.centerx - title.get_width() // 2, self.layout.popup_title_y))
         
-        # List
-        y = popup.y + 70
-        for f in self.sound_files:
+        # List (only the rows that fit above the Select button)
+        list_rect = rects['sound_list']
+        x, y = list_rect.x + self.layout.text_inset, list_rect.y
+        first, last = self.visible_sound_rows()
+        for f in self.sound_files[first:last]:
             color = (255, 255, 0) if f == self.selected_sound_file else (200, 200, 200)
-            txt = self.font.render(f, True, color)
-            self.screen.blit(txt, (popup.x + 30, y))
-            y += 40
+            txt = self.render_text(f, color)
+            self.screen.blit(txt, (x, y))
+            y += self.layout.row_height
             
         # Select Button
         btn = rects['popup_select_btn']
         pygame.draw.rect(self.screen, (0, 100, 0), btn)
         pygame.draw.rect(self.screen, (255, 255, 255), btn, 2)
-        btn_txt = self.font.render("Select", True, (255, 255, 255))
+        btn_txt = self.render_text("Select", (255, 255, 255))
         self.screen.blit(btn_txt, (btn.centerx - btn_txt.get_width() // 2, btn.centery - btn_txt.get_height() // 2))
 
     def draw_warning_popup(self):
@@ -574,32 +1621,44 @@ class AlarmClockApp:
         popup = rects['warning_popup_bg']
         
         # Overlay
-        s = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
-        s.fill((0, 0, 0, 200))
-        self.screen.blit(s, (0, 0))
+        self.screen.blit(self.get_popup_backdrop(), (0, 0))
         
         # Popup Box
         pygame.draw.rect(self.screen, (100, 0, 0), popup)
         pygame.draw.rect(self.screen, (255, 255, 255), popup, 2)
         
         # Message
-        msg = self.font.render(self.warning_message, True, (255, 255, 255))
-        self.screen.blit(msg, (popup.centerx - msg.get_width() // 2, popup.y + 80))
+        msg = self.render_text(self.warning_message, (255, 255, 255))
+        self.screen.blit(msg, (popup.centerx - msg.get_width() // 2, self.layout.warning_text_y))
         
         # Yes Button
         btn_yes = rects['warning_yes']
         pygame.draw.rect(self.screen, (0, 100, 0), btn_yes)
         pygame.draw.rect(self.screen, (255, 255, 255), btn_yes, 2)
-        txt_yes = self.font.render("Yes", True, (255, 255, 255))
+        txt_yes = self.render_text("Yes", (255, 255, 255))
         self.screen.blit(txt_yes, (btn_yes.centerx - txt_yes.get_width() // 2, btn_yes.centery - txt_yes.get_height() // 2))
 
         # No Button
         btn_no = rects['warning_no']
         pygame.draw.rect(self.screen, (100, 0, 0), btn_no)
         pygame.draw.rect(self.screen, (255, 255, 255), btn_no, 2)
-        txt_no = self.font.render("No", True, (255, 255, 255))
+        txt_no = self.render_text("No", (255, 255, 255))
         self.screen.blit(txt_no, (btn_no.centerx - txt_no.get_width() // 2, btn_no.centery - txt_no.get_height() // 2))
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Alarm clock")
+    parser.add_argument('--stats-overlay', action='store_true', help="show frame timings on screen")
+    parser.add_argument('--stats-log', help="append a frame timing summary to this file as JSON lines")
+    parser.add_argument('--stats-interval', type=float, default=10.0, help="seconds between log lines")
+    parser.add_argument('--control-port', type=int, help="serve the local control API on this localhost port")
+    parser.add_argument('--record', metavar='PATH', help="record the session for alarm_replay.py")
+    args = parser.parse_args()
+
     app = AlarmClockApp()
+    if args.stats_overlay or args.stats_log:
+        app.enable_stats(overlay=args.stats_overlay, log_path=args.stats_log, log_interval=args.stats_interval)
+    if args.control_port:
+        app.enable_control(args.control_port)
+    if args.record:
+        app.enable_recording(args.record)
     app.run()
@@ -0,0 +1,335 @@
+"""Headless rendering benchmark for AlarmClockApp.
+
+Runs the app on SDL's dummy video/audio drivers, drives update()/draw()
+for a number of frames in every UI mode and prints the results as JSON:
+
+    python alarm_bench.py --frames 300 [--dirty] [--size 800x480] [--output results.json]
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import contextlib
+import random
+from datetime import datetime, timedelta
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+import alarm
+import alarm_engine
+from alarm_stats import percentile
+
+
+class Counters:
+    """Counts surface-producing pygame calls made while the benchmark runs."""
+
+    def __init__(self):
+        self.smoothscale = 0
+        self.surfaces = 0
+        self.text_renders = 0
+        self.blits = 0
+
+    def reset(self):
+        self.smoothscale = self.surfaces = self.text_renders = self.blits = 0
+
+
+COUNTERS = Counters()
+
+
+class CountingSurface(pygame.Surface):
+    def __init__(self, *args, **kwargs):
+        COUNTERS.surfaces += 1
+        super().__init__(*args, **kwargs)
+
+    def blit(self, *args, **kwargs):
+        COUNTERS.blits += 1
+        return super().blit(*args, **kwargs)
+
+
+class CountingFont:
+    def __init__(self, font):
+        self.font = font
+
+    def render(self, *args, **kwargs):
+        COUNTERS.text_renders += 1
+        COUNTERS.surfaces += 1
+        return self.font.render(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.font, name)
+
+
+def install_counters():
+    smoothscale = pygame.transform.smoothscale
+
+    def counting_smoothscale(*args, **kwargs):
+        COUNTERS.smoothscale += 1
+        COUNTERS.surfaces += 1
+        return smoothscale(*args, **kwargs)
+
+    pygame.transform.smoothscale = counting_smoothscale
+    pygame.Surface = CountingSurface
+
+
+def set_mode(app, mode):
+    app.is_setting_alarm = mode == 'setting_alarm'
+    app.is_setting_brightness = mode == 'brightness_slider'
+    app.is_selecting_sound = mode == 'sound_popup'
+    app.showing_warning_popup = mode == 'warning_popup'
+    app.warning_message = "Alarm for Weekend & Holiday. Continue?"
+    app.setting_stage = 'hours'
+    if mode == 'night_dimming':
+        app.engine.is_night_mode = lambda: True
+        app.night_brightness = 0.5
+    else:
+        app.engine.is_night_mode = lambda: False
+        app.day_brightness = 1.0
+    app.last_frame = None
+
+
+MODES = ['normal', 'setting_alarm', 'brightness_slider', 'sound_popup', 'warning_popup', 'night_dimming']
+
+
+def bench_mode(app, mode, frames, dirty=False, warmup=5):
+    set_mode(app, mode)
+    render = app.draw_dirty if dirty else app.draw
+    for _ in range(warmup):
+        app.update()
+        render()
+
+    COUNTERS.reset()
+    times = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        app.update()
+        render()
+        times.append(time.perf_counter() - start)
+
+    return {
+        'frames': frames,
+        'mean_ms': sum(times) / frames * 1000,
+        'p99_ms': percentile(times, 99) * 1000,
+        'surface_allocs_per_frame': COUNTERS.surfaces / frames,
+        'smoothscale_per_frame': COUNTERS.smoothscale / frames,
+        'text_renders_per_frame': COUNTERS.text_renders / frames,
+        'blits_per_frame': COUNTERS.blits / frames,
+    }
+
+
+def bench_schedule(app, counts, frames):
+    """Per-frame update() cost with many alarms scheduled; should stay flat as N grows."""
+    rng = random.Random(0)
+    today = datetime.now().date()
+    results = {}
+    for count in counts:
+        app.schedule = alarm_engine.AlarmSchedule()
+        for _ in range(count):
+            kind = rng.random()
+            hour, minute = rng.randrange(24), rng.randrange(60)
+            if kind < 0.4:
+                a = alarm_engine.Alarm(hour, minute)
+            elif kind < 0.8:
+                a = alarm_engine.Alarm(hour, minute, days=range(5))
+            else:
+                a = alarm_engine.Alarm(hour, minute, on_date=today + timedelta(days=rng.randrange(1, 365)))
+            app.schedule.add(a)
+
+        times = []
+        for _ in range(frames):
+            start = time.perf_counter()
+            app.update()
+            times.append(time.perf_counter() - start)
+        results[str(count)] = {
+            'mean_us': sum(times) / frames * 1e6,
+            'p99_us': percentile(times, 99) * 1e6,
+        }
+    return results
+
+
+def bench_calendar(counts, repeats=20):
+    """Time "which of the next N fire dates are flagged" with the calendar index
+    against checking each date with weekday() and the holiday set."""
+    holidays = alarm_engine.RuleBasedHolidays()
+    first = datetime.now().date()
+    weekdays = frozenset(range(5))
+    indexes = {'array': alarm_engine.CalendarIndex(holidays)}
+    numpy_index = alarm_engine.CalendarIndex(holidays, use_numpy=True)
+    if numpy_index.np is not None:
+        indexes['numpy'] = numpy_index
+
+    def per_date(count):
+        flagged = []
+        day = first
+        n = 0
+        while n < count:
+            if day.weekday() in weekdays:
+                n += 1
+                if day.weekday() in (5, 6) or holidays.is_holiday(day):
+                    flagged.append(day)
+            day += timedelta(days=1)
+        return flagged
+
+    def timed(fn):
+        fn()  # builds any years the query needs
+        start = time.perf_counter()
+        for _ in range(repeats):
+            fn()
+        return (time.perf_counter() - start) / repeats * 1e6
+
+    start = time.perf_counter()
+    indexes['array'].ensure(first.year, first.year)
+    results = {'build_year_ms': (time.perf_counter() - start) * 1000, 'counts': {}}
+    for count in counts:
+        row = {'per_date_us': timed(lambda: per_date(count))}
+        for name, index in indexes.items():
+            row[name + '_us'] = timed(lambda: index.flagged(first, count, weekdays))
+        results['counts'][str(count)] = row
+    return results
+
+
+def bench_taps(app, counts, taps):
+    """Tap-to-response time on a sound list row; should stay flat as the library grows."""
+    set_mode(app, 'sound_popup')
+    list_rect = app.get_rects()['sound_list']
+    pos = (list_rect.centerx, list_rect.y + app.layout.row_height // 2)
+    results = {}
+    for count in counts:
+        # Every entry is the real alarm file so each tap loads (from cache) and previews it
+        app.sound_files = [app.active_alarm_file] * count
+        app.scroll_sound_list(count)
+        times = []
+        for _ in range(taps):
+            start = time.perf_counter()
+            app.handle_click(pos)
+            app.handle_release(pos)
+            times.append(time.perf_counter() - start)
+        if app.preview_sound_obj:
+            app.preview_sound_obj.stop()
+        results[str(count)] = {
+            'mean_us': sum(times) / taps * 1e6,
+            'p99_us': percentile(times, 99) * 1e6,
+        }
+    return results
+
+
+def bench_onset(app, repeats):
+    """Scheduled time to alarm onset: armed timer thread against the frame-polled wake of run()."""
+    if app.pending_alarm_sound:
+        app.alarm_sound = app.pending_alarm_sound.result()
+        app.pending_alarm_sound = None
+    if not app.audio.probe or not app.alarm_sound:
+        return {'error': 'no mixer or alarm sound'}
+    audio = app.audio
+    rng = random.Random(0)
+    results = {}
+
+    onsets = []
+    for _ in range(repeats):
+        audio.onsets.clear()
+        audio.arm(time.monotonic() + 0.05 + rng.random() * 0.02)
+        while not audio.onsets:
+            time.sleep(0.005)
+        onsets.append(audio.onsets[0])
+        audio.stop_alarm()
+    results['armed'] = audio.onset_stats(o for o in onsets if o['start_ms'] >= 0)
+
+    onsets = []
+    for _ in range(repeats):
+        audio.onsets.clear()
+        deadline = time.monotonic() + 0.05 + rng.random() * 0.02
+        # What run() does: sleep until just after the boundary, update, then
+        # start the sound. wait() returns at once while events are queued, so
+        # drop those and keep waiting until the boundary has really passed
+        pygame.event.clear()
+        while time.monotonic() < deadline:
+            pygame.event.wait(int((deadline - time.monotonic()) * 1000) + 5)
+        app.update()
+        audio.start_timed(audio.prepare(), deadline)
+        onsets.append(audio.onsets[0])
+        audio.stop_alarm()
+    results['polled'] = audio.onset_stats(o for o in onsets if o['start_ms'] >= 0)
+    results['mixer'] = list(pygame.mixer.get_init())
+    return results
+
+
+def run_benchmark(frames=300, dirty=False, modes=MODES, alarm_counts=(), size=alarm.Layout.DESIGN_SIZE,
+                  sound_counts=(), atlas=True, calendar_counts=(), onsets=0):
+    install_counters()
+    start = time.perf_counter()
+    # Offline holidays: no fetch worker, nothing written next to the script
+    app = alarm.AlarmClockApp(size=size, holidays=alarm_engine.RuleBasedHolidays())
+    app.use_glyph_atlas = atlas
+    app.update()
+    app.draw()
+    startup = {
+        'time_to_first_frame_ms': (time.perf_counter() - start) * 1000,
+        'assets_loaded': len(app.assets),
+        'assets_deferred': len(app.assets.pending),
+    }
+
+    app.font = CountingFont(app.font)
+    # Draw into an offscreen copy of the display surface so blits can be counted
+    app.screen = CountingSurface(app.screen.get_size(), 0, app.screen)
+    if atlas:
+        # Wait for the deferred glyph decodes so every mode is timed with the atlas
+        app.assets.wait()
+        app.ensure_glyph_atlas()
+    results = {
+        'frames': frames,
+        'dirty': dirty,
+        'size': list(app.layout.size),
+        'startup': startup,
+        'modes': {mode: bench_mode(app, mode, frames, dirty) for mode in modes},
+        'scaled_cache': app.scaled_cache_stats(),
+        'glyph_atlas': app.glyph_atlas_stats(),
+    }
+    if alarm_counts:
+        results['schedule'] = bench_schedule(app, alarm_counts, frames)
+    if sound_counts:
+        results['taps'] = bench_taps(app, sound_counts, frames)
+    if calendar_counts:
+        results['calendar'] = bench_calendar(calendar_counts)
+    if onsets:
+        results['onset'] = bench_onset(app, onsets)
+    pygame.quit()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--dirty', action='store_true', help="render with draw_dirty() instead of draw()")
+    parser.add_argument('--mode', action='append', choices=MODES, help="benchmark only these modes")
+    parser.add_argument('--alarms', type=int, nargs='+', default=[],
+                        help="also time update() with this many alarms scheduled, e.g. --alarms 1 100 10000")
+    parser.add_argument('--sounds', type=int, nargs='+', default=[],
+                        help="also time sound-list taps with this many sounds, e.g. --sounds 10 1000 100000")
+    parser.add_argument('--calendar', type=int, nargs='+', default=[],
+                        help="also time flagged-date queries over this many fire dates, e.g. --calendar 1 100 10000")
+    parser.add_argument('--onset', type=int, default=0, metavar='N',
+                        help="also time N alarm starts from their scheduled instant to the first mixed sample")
+    parser.add_argument('--no-atlas', dest='atlas', action='store_false',
+                        help="draw clock and date glyphs from the scaled cache instead of the glyph atlas")
+    parser.add_argument('--size', type=alarm.parse_size,
+                        default=alarm.Layout.DESIGN_SIZE, help="display size WIDTHxHEIGHT (default 1280x800)")
+    parser.add_argument('--output', help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    # Keep stdout clean for the JSON report; the app prints its own diagnostics
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run_benchmark(args.frames, args.dirty, args.mode or MODES, args.alarms, args.size,
+                                args.sounds, args.atlas, args.calendar, args.onset)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
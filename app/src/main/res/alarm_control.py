@@ -0,0 +1,483 @@
+"""Local control server for one or more AlarmClockApps.
+
+An asyncio server runs on its own thread so the frame loop never waits on
+a socket. Clients send one JSON request, or a JSON array of requests (a
+batch), per line and get one JSON response, or an array, per line:
+
+    {"id": 1, "op": "get", "clock": 0}
+    {"id": 2, "op": "set", "clock": [0, 1], "alarm": {"time": "06:45", "active": true}}
+    {"id": 3, "op": "set", "brightness": {"day": 0.8, "night": 0.2}, "sound": "alarm_birds.wav"}
+    {"id": 4, "op": "sounds", "clock": 0}
+    {"id": 5, "op": "subscribe"}
+
+"clock" is an index, a list of them, or omitted for every clock. Reads
+are answered on the server thread from state snapshots that clocks
+publish when they change. A request or batch that sets anything is
+queued for the frame loop, which applies queued work in poll() within a
+per-frame time budget; a batch is applied within one frame. After
+"subscribe" the connection also receives {"event": "state", "clock": n,
+"state": {...}} lines as clocks change, coalesced per clock.
+
+    python alarm_control.py --load-test 0 10 100 500 [--clocks 4] [--duration 5]
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+import contextlib
+from collections import deque
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+from alarm_stats import percentile
+
+# Posted to wake a frame loop blocked in pygame.event.wait() when requests are queued
+WAKE_EVENT = pygame.event.custom_type()
+
+
+def clock_state(app):
+    engine = app.engine
+    return {
+        'alarm': {'time': engine.alarm_set_time, 'active': engine.alarm_active,
+                  'skip_holidays': engine.skip_holidays},
+        'brightness': {'day': engine.day_brightness, 'night': engine.night_brightness},
+        'sound': app.active_alarm_file,
+    }
+
+
+def post_wake():
+    pygame.event.post(pygame.event.Event(WAKE_EVENT))
+
+
+class ControlServer:
+    OPS = ('get', 'set', 'sounds', 'subscribe')
+    MAX_CLIENTS = 1024
+    MAX_BATCH = 100
+    # A subscriber that lets this much output pile up is disconnected
+    MAX_BUFFER = 1024 * 1024
+
+    def __init__(self, apps, host='127.0.0.1', port=8765, wake=post_wake, budget=0.002):
+        self.host = host
+        self.port = port
+        self.wake = wake
+        # Seconds of queued work poll() may do per frame; at least one batch always runs
+        self.budget = budget
+        self.apps = []
+        # Server thread side: latest published state per clock, and subscribers
+        self.states = {}
+        self.subscribers = {}
+        self.changed = set()
+        self.clients = 0
+        self.loop = None
+        self.server = None
+        self.thread = None
+        # Frame loop side: (requests, future) batches waiting for poll()
+        self.queue = deque()
+        self.woken = False
+        self.applying = None
+        # Requests served, counted on the server thread
+        self.requests = 0
+        for app in apps:
+            self.add(app)
+
+    def add(self, app):
+        """Serve another clock; call from the frame loop's thread."""
+        index = len(self.apps)
+        self.apps.append(app)
+        app.on_change = lambda app, index=index: self.publish(index)
+        self.publish(index)
+
+    def start(self):
+        """Start serving on a background thread; returns once the socket is bound."""
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self.serve_forever, args=(ready,), daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self.port
+
+    def serve_forever(self, ready):
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(
+            asyncio.start_server(self.handle, self.host, self.port))
+        self.port = self.server.sockets[0].getsockname()[1]
+        ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.server.close()
+            self.loop.run_until_complete(self.server.wait_closed())
+            self.loop.close()
+
+    def stop(self):
+        if self.loop is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+
+    # Frame loop side
+
+    def pending(self):
+        return bool(self.queue)
+
+    def publish(self, index):
+        if self.applying is not None:
+            # Published once when poll() finishes
+            self.applying.add(index)
+            return
+        state = clock_state(self.apps[index])
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.store_state, index, state)
+        else:
+            self.states[index] = state
+
+    def poll(self):
+        """Apply queued requests, stopping once this frame's budget is used."""
+        self.woken = False
+        if not self.queue:
+            return
+        deadline = time.perf_counter() + self.budget
+        self.applying = set()
+        try:
+            while self.queue:
+                requests, future = self.queue.popleft()
+                responses = [self.execute(r) for r in requests]
+                self.loop.call_soon_threadsafe(self.resolve, future, responses)
+                if time.perf_counter() >= deadline:
+                    break
+        finally:
+            changed, self.applying = self.applying, None
+        for index in changed:
+            self.publish(index)
+
+    def execute(self, request):
+        if 'error' in request:
+            return request
+        op, clocks = request['op'], request['clocks']
+        try:
+            if op == 'set':
+                for c in clocks:
+                    self.apply(self.apps[c], request)
+            elif op == 'sounds':
+                return self.sounds(request)
+            return {'id': request['id'], 'ok': True,
+                    'result': {str(c): clock_state(self.apps[c]) for c in clocks}}
+        except Exception as e:
+            return {'id': request['id'], 'ok': False, 'error': str(e)}
+
+    def apply(self, app, request):
+        engine = app.engine
+        if 'time' in request:
+            engine.set_alarm_time(*request['time'])
+        if 'skip_holidays' in request:
+            engine.set_skip_holidays(request['skip_holidays'])
+        if 'active' in request:
+            engine.set_alarm_active(request['active'])
+        if 'day' in request or 'night' in request:
+            engine.set_brightness_levels(request.get('day'), request.get('night'))
+        if 'sound' in request:
+            app.set_alarm_file(request['sound'])
+
+    # Server thread side
+
+    def store_state(self, index, state):
+        self.states[index] = state
+        if self.subscribers and not self.changed:
+            self.loop.call_soon(self.notify)
+        if self.subscribers:
+            self.changed.add(index)
+
+    def notify(self):
+        changed, self.changed = self.changed, set()
+        for index in changed:
+            line = (json.dumps({'event': 'state', 'clock': index, 'state': self.states[index]}) + '\n').encode()
+            for writer, clocks in list(self.subscribers.items()):
+                if index not in clocks:
+                    continue
+                if writer.transport.get_write_buffer_size() > self.MAX_BUFFER:
+                    del self.subscribers[writer]
+                    writer.close()
+                else:
+                    writer.write(line)
+
+    def resolve(self, future, responses):
+        if not future.done():
+            future.set_result(responses)
+
+    def parse_clocks(self, clock):
+        count = len(self.apps)
+        if clock is None:
+            return list(range(count))
+        clocks = clock if isinstance(clock, list) else [clock]
+        for c in clocks:
+            if not isinstance(c, int) or isinstance(c, bool) or not 0 <= c < count:
+                raise ValueError(f"no clock {c!r}")
+        return clocks
+
+    def parse(self, request):
+        """Validate a request into the form execute() takes, or an error response."""
+        request_id = request.get('id') if isinstance(request, dict) else None
+        try:
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            op = request.get('op')
+            if op not in self.OPS:
+                raise ValueError(f"unknown op {op!r}")
+            parsed = {'id': request_id, 'op': op, 'clocks': self.parse_clocks(request.get('clock'))}
+            if op == 'set':
+                parsed.update(self.parse_changes(request, parsed['clocks']))
+            return parsed
+        except ValueError as e:
+            return {'id': request_id, 'ok': False, 'error': str(e)}
+
+    def parse_changes(self, request, clocks):
+        changes = {}
+        alarm = request.get('alarm') or {}
+        brightness = request.get('brightness') or {}
+        if not isinstance(alarm, dict) or not isinstance(brightness, dict):
+            raise ValueError("alarm and brightness must be objects")
+        if 'time' in alarm:
+            try:
+                hour, minute = map(int, str(alarm['time']).split(':'))
+            except ValueError:
+                raise ValueError(f"alarm time must be HH:MM, got {alarm['time']!r}")
+            if not (0 <= hour < 24 and 0 <= minute < 60):
+                raise ValueError(f"alarm time out of range: {alarm['time']!r}")
+            changes['time'] = (hour, minute)
+        for key in ('active', 'skip_holidays'):
+            if key in alarm:
+                if not isinstance(alarm[key], bool):
+                    raise ValueError(f"alarm {key} must be true or false")
+                changes[key] = alarm[key]
+        for key in ('day', 'night'):
+            if key in brightness:
+                value = brightness[key]
+                # Same range as the slider
+                if not isinstance(value, (int, float)) or isinstance(value, bool) or not 0.1 <= value <= 1.0:
+                    raise ValueError(f"{key} brightness must be a number from 0.1 to 1.0")
+                changes[key] = float(value)
+        if 'sound' in request:
+            sound = request['sound']
+            for c in clocks:
+                if sound not in self.apps[c].sound_files:
+                    raise ValueError(f"clock {c} has no sound {sound!r}")
+            changes['sound'] = sound
+        if not changes:
+            raise ValueError("set needs alarm, brightness or sound")
+        return changes
+
+    def sounds(self, request):
+        return {'id': request['id'], 'ok': True,
+                'result': {str(c): list(self.apps[c].sound_files) for c in request['clocks']}}
+
+    def answer(self, request):
+        """Answer a read from the published snapshots, without the frame loop."""
+        if 'error' in request:
+            return request
+        if request['op'] == 'sounds':
+            return self.sounds(request)
+        return {'id': request['id'], 'ok': True,
+                'result': {str(c): self.states[c] for c in request['clocks']}}
+
+    async def serve(self, requests, writer):
+        parsed = [self.parse(r) for r in requests]
+        self.requests += len(parsed)
+        for request in parsed:
+            if request.get('op') == 'subscribe':
+                self.subscribers.setdefault(writer, set()).update(request['clocks'])
+        if not any(r.get('op') == 'set' for r in parsed):
+            return [self.answer(r) for r in parsed]
+        future = self.loop.create_future()
+        self.queue.append((parsed, future))
+        if not self.woken:
+            self.woken = True
+            self.wake()
+        return await future
+
+    async def handle(self, reader, writer):
+        if self.clients >= self.MAX_CLIENTS:
+            writer.close()
+            return
+        self.clients += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    payload = json.loads(line)
+                except ValueError as e:
+                    response = {'id': None, 'ok': False, 'error': f"invalid JSON: {e}"}
+                else:
+                    if isinstance(payload, list):
+                        if not 0 < len(payload) <= self.MAX_BATCH:
+                            response = {'id': None, 'ok': False,
+                                        'error': f"a batch holds 1 to {self.MAX_BATCH} requests"}
+                        else:
+                            response = await self.serve(payload, writer)
+                    else:
+                        response = (await self.serve([payload], writer))[0]
+                writer.write((json.dumps(response) + '\n').encode())
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            # ValueError: a line longer than the reader's limit
+            pass
+        finally:
+            self.clients -= 1
+            self.subscribers.pop(writer, None)
+            writer.close()
+
+
+async def run_client(port, clocks, deadline, seed, subscribe, stats):
+    """One load-test client: a request every 50-150 ms until `deadline`."""
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    waiting = {}
+
+    async def read():
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            message = json.loads(line)
+            if isinstance(message, dict) and 'event' in message:
+                stats['notifications'] += 1
+                continue
+            first = message[0] if isinstance(message, list) else message
+            if not first.get('ok'):
+                stats['errors'] += 1
+            future = waiting.pop(first.get('id'), None)
+            if future:
+                future.set_result(message)
+
+    async def request(payload, request_id):
+        future = asyncio.get_running_loop().create_future()
+        waiting[request_id] = future
+        start = time.perf_counter()
+        writer.write((json.dumps(payload) + '\n').encode())
+        await future
+        stats['latencies'].append(time.perf_counter() - start)
+
+    reader_task = asyncio.ensure_future(read())
+    n = 0
+    if subscribe:
+        n += 1
+        await request({'id': n, 'op': 'subscribe'}, n)
+    while time.monotonic() < deadline:
+        await asyncio.sleep(rng.uniform(0.05, 0.15))
+        n += 1
+        clock = rng.randrange(clocks)
+        kind = rng.random()
+        if kind < 0.6:
+            payload = {'id': n, 'op': 'get', 'clock': clock}
+        elif kind < 0.8:
+            payload = {'id': n, 'op': 'set', 'clock': clock,
+                       'brightness': {'day': round(rng.uniform(0.1, 1.0), 2)}}
+        elif kind < 0.9:
+            payload = {'id': n, 'op': 'set', 'clock': clock,
+                       'alarm': {'time': f"{rng.randrange(24):02d}:{rng.randrange(60):02d}"}}
+        else:
+            payload = [{'id': n, 'op': 'set', 'clock': list(range(clocks)),
+                        'alarm': {'time': f"{rng.randrange(24):02d}:{rng.randrange(60):02d}"}},
+                       {'id': n + 1, 'op': 'get'}]
+        await request(payload, n)
+        n += 1
+    reader_task.cancel()
+    writer.close()
+
+
+def run_clients(port, count, clocks, duration, results):
+    """Child process body: `count` clients, one in ten also subscribed to changes."""
+    stats = {'latencies': [], 'notifications': 0, 'errors': 0}
+
+    async def main():
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*(run_client(port, clocks, deadline, i, i % 10 == 0, stats)
+                               for i in range(count)))
+
+    asyncio.run(main())
+    results.put(stats)
+
+
+def drive(host, duration, fps=30):
+    """Step the host at `fps`, stepping early when requests wake it; returns per-step times."""
+    times = []
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        host.step()
+        times.append(time.perf_counter() - start)
+        delay = 0 if host.control.pending() else 1 / fps - (time.perf_counter() - start)
+        if delay > 0:
+            host.wake.wait(delay)
+        host.wake.clear()
+    return times
+
+
+def load_test(client_counts, clocks=4, duration=5.0, size=(800, 480)):
+    """Frame time of a kiosk host with `clocks` clocks while N clients use the control API."""
+    import multiprocessing
+    from alarm_kiosk import KioskHost
+    from alarm_engine import RuleBasedHolidays
+
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    host = KioskHost(clocks, size, settings_dir=tempfile.mkdtemp(), holidays=RuleBasedHolidays())
+    host.shared.assets.wait()
+    control = host.enable_control(port=0)
+    context = multiprocessing.get_context('spawn')
+    results = {'clocks': clocks, 'duration_s': duration, 'clients': {}}
+    for count in client_counts:
+        queue = context.Queue()
+        child = None
+        if count:
+            child = context.Process(target=run_clients, args=(control.port, count, clocks, duration, queue))
+            child.start()
+        # Warm up, and let the clients connect, before timing
+        drive(host, 0.5)
+        served = control.requests
+        times = drive(host, duration)
+        row = {
+            'frames': len(times),
+            'frame_p50_ms': percentile(times, 50) * 1000,
+            'frame_p99_ms': percentile(times, 99) * 1000,
+            'frame_max_ms': max(times) * 1000,
+            'requests_per_s': (control.requests - served) / duration,
+        }
+        if child:
+            stats = queue.get()
+            child.join()
+            latencies = stats['latencies'] or [0]
+            row.update({
+                'requests': len(stats['latencies']),
+                'latency_p50_ms': percentile(latencies, 50) * 1000,
+                'latency_p99_ms': percentile(latencies, 99) * 1000,
+                'notifications': stats['notifications'],
+                'errors': stats['errors'],
+            })
+        results['clients'][str(count)] = row
+    control.stop()
+    host.flush()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--load-test', type=int, nargs='+', metavar='N', required=True,
+                        help="print kiosk frame times with this many control clients as JSON")
+    parser.add_argument('--clocks', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds per client count")
+    args = parser.parse_args(argv)
+
+    # Keep stdout clean for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = load_test(args.load_test, args.clocks, args.duration)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
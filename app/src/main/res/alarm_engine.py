@@ -0,0 +1,1006 @@
+"""Alarm scheduling, holiday and settings logic, independent of pygame.
+
+AlarmEngine holds the alarm state and trigger logic. Its clock, audio
+backend and holiday provider are injectable, so it can drive the pygame
+clock face in alarm.py, run as a headless daemon, or be stepped through
+simulated time.
+"""
+import os
+import re
+import time
+import heapq
+import threading
+from datetime import date, datetime, timedelta, timezone
+import json
+
+# Month asset keys, in calendar order
+MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+
+def format_clock(hour, minute):
+    """12-hour 'hh:mm' string and 'am'/'pm' asset key for a 24-hour time."""
+    return f"{hour % 12 or 12:02d}:{minute:02d}", 'am' if hour < 12 else 'pm'
+
+def nth_weekday(year, month, weekday, n):
+    """Date of the n-th given weekday (0=Monday) of a month; n=-1 means the last one."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    nxt = date(year + (month == 12), month % 12 + 1, 1)
+    last = nxt - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def us_federal_holidays(year):
+    """Offline rule-based US federal holidays for a year, as 'YYYY-MM-DD' strings.
+
+    Fixed-date holidays falling on a weekend also include the observed
+    weekday (Saturday -> Friday, Sunday -> Monday).
+    """
+    fixed = [date(year, 1, 1), date(year, 7, 4), date(year, 11, 11), date(year, 12, 25)]
+    if year >= 2021:
+        fixed.append(date(year, 6, 19))
+    days = set(fixed)
+    for d in fixed:
+        if d.weekday() == 5:
+            days.add(d - timedelta(days=1))
+        elif d.weekday() == 6:
+            days.add(d + timedelta(days=1))
+    days.update([
+        nth_weekday(year, 1, 0, 3),   # Martin Luther King Jr. Day
+        nth_weekday(year, 2, 0, 3),   # Washington's Birthday
+        nth_weekday(year, 5, 0, -1),  # Memorial Day
+        nth_weekday(year, 9, 0, 1),   # Labor Day
+        nth_weekday(year, 10, 0, 2),  # Columbus Day
+        nth_weekday(year, 11, 3, 4),  # Thanksgiving
+    ])
+    # Next year's New Year's Day observed on Dec 31st
+    if date(year + 1, 1, 1).weekday() == 5:
+        days.add(date(year, 12, 31))
+    return {d.strftime("%Y-%m-%d") for d in days if d.year == year}
+
+class HolidayProvider:
+    """Non-blocking US holiday lookup backed by a background fetch worker.
+
+    Fetched years are persisted to a JSON file and refreshed after `ttl`
+    seconds. Failed fetches are retried with exponential backoff. Until a
+    year has been fetched, lookups answer from us_federal_holidays().
+    """
+    URL = "https://date.nager.at/api/v3/PublicHolidays/{year}/US"
+
+    def __init__(self, cache_path, url=URL, ttl=30 * 86400, timeout=3,
+                 retry_base=30, retry_max=3600):
+        self.cache_path = cache_path
+        self.url = url
+        self.ttl = ttl
+        self.timeout = timeout
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+
+        # year -> set of 'YYYY-MM-DD' strings, fetched or loaded from disk
+        self.cache = {}
+        self.fetched_at = {}
+        # year -> (next attempt time, consecutive failures)
+        self.pending = {}
+        self.cond = threading.Condition()
+        self.worker = None
+        self.load_cache()
+
+    def load_cache(self):
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+            for year, entry in data.get('years', {}).items():
+                self.cache[int(year)] = set(entry['dates'])
+                self.fetched_at[int(year)] = entry['fetched']
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Could not read holiday cache: {e}")
+
+    def save_cache(self):
+        with self.cond:
+            data = {'years': {
+                str(y): {'fetched': self.fetched_at[y], 'dates': sorted(self.cache[y])}
+                for y in self.cache
+            }}
+        tmp = self.cache_path + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp, self.cache_path)
+        except Exception as e:
+            print(f"Could not write holiday cache: {e}")
+
+    def start(self, years=None):
+        """Start the worker and prefetch the current and next year."""
+        if years is None:
+            this_year = date.today().year
+            years = [this_year, this_year + 1]
+        for year in years:
+            self.request(year)
+        if self.worker is None:
+            self.worker = threading.Thread(target=self.run_worker, daemon=True)
+            self.worker.start()
+
+    def request(self, year):
+        """Queue a fetch for `year` unless it is fresh or already queued."""
+        with self.cond:
+            fresh = year in self.cache and time.time() - self.fetched_at[year] < self.ttl
+            if not fresh and year not in self.pending:
+                self.pending[year] = (0, 0)
+                self.cond.notify()
+
+    def fetch(self, year):
+        # Imported lazily: urllib.request is slow to import and only the worker needs it
+        import urllib.request
+        with urllib.request.urlopen(self.url.format(year=year), timeout=self.timeout) as response:
+            data = json.loads(response.read().decode())
+        return {d['date'] for d in data}
+
+    def run_worker(self):
+        while True:
+            with self.cond:
+                while True:
+                    now = time.time()
+                    due = [y for y, (at, _) in self.pending.items() if at <= now]
+                    if due:
+                        year = due[0]
+                        failures = self.pending[year][1]
+                        break
+                    wait = min((at for at, _ in self.pending.values()), default=now + 3600) - now
+                    self.cond.wait(wait)
+            try:
+                dates = self.fetch(year)
+            except Exception as e:
+                print(f"Could not fetch holidays for {year}: {e}")
+                delay = min(self.retry_max, self.retry_base * 2 ** failures)
+                with self.cond:
+                    self.pending[year] = (time.time() + delay, failures + 1)
+                continue
+            with self.cond:
+                self.cache[year] = dates
+                self.fetched_at[year] = time.time()
+                self.pending.pop(year, None)
+            self.save_cache()
+
+    def holidays_for(self, year):
+        """Holiday set for `year`; never blocks."""
+        with self.cond:
+            dates = self.cache.get(year)
+        self.request(year)
+        if dates is None:
+            return us_federal_holidays(year)
+        return dates
+
+    def is_holiday(self, date_obj):
+        return date_obj.strftime("%Y-%m-%d") in self.holidays_for(date_obj.year)
+
+class SettingsStore:
+    """Small JSON settings file with atomic, debounced writes.
+
+    save() only records the new values; they reach disk once no further
+    change has arrived for `debounce` seconds (see flush_if_due), or on an
+    explicit flush(). Writes go to a temp file that is renamed into place.
+    """
+
+    def __init__(self, path, debounce=2.0, clock=None):
+        self.path = path
+        self.debounce = debounce
+        self.monotonic = clock.monotonic if clock else time.monotonic
+        self.values = {}
+        self.dirty_since = None
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                self.values = json.load(f)
+        except FileNotFoundError:
+            self.values = {}
+        except Exception as e:
+            print(f"Could not read settings: {e}")
+            self.values = {}
+        return dict(self.values)
+
+    def save(self, values):
+        if values != self.values:
+            self.values = dict(values)
+            self.dirty_since = self.monotonic()
+
+    def flush_deadline(self):
+        """Monotonic time the pending write is due, or None if nothing is pending."""
+        if self.dirty_since is None:
+            return None
+        return self.dirty_since + self.debounce
+
+    def flush_if_due(self, now=None):
+        deadline = self.flush_deadline()
+        if deadline is not None and (now or self.monotonic()) >= deadline:
+            self.flush()
+
+    def flush(self):
+        if self.dirty_since is None:
+            return
+        self.dirty_since = None
+        tmp = self.path + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self.values, f, indent=2)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"Could not write settings: {e}")
+
+class Alarm:
+    """One alarm time.
+
+    `days` is a set of weekdays (0=Monday) the alarm repeats on, or None for
+    every day. A one-shot alarm fires once on `on_date` and is then dropped
+    from the schedule. A recurring alarm passes over days carrying any of
+    the CalendarIndex flags in `skip`, e.g. DAY_HOLIDAY. Every alarm rings
+    the engine's one alarm sound.
+    """
+
+    def __init__(self, hour, minute, days=None, on_date=None, skip=0):
+        self.hour = hour
+        self.minute = minute
+        self.days = frozenset(days) if days is not None else None
+        self.on_date = on_date
+        self.skip = skip
+
+    def settings_value(self):
+        return {
+            'time': f"{self.hour:02d}:{self.minute:02d}",
+            'days': sorted(self.days) if self.days is not None else None,
+            'on_date': self.on_date.isoformat() if self.on_date else None,
+            'skip': self.skip,
+        }
+
+    @classmethod
+    def from_settings(cls, value):
+        hour, minute = map(int, value['time'].split(':'))
+        on_date = value.get('on_date')
+        return cls(hour % 24, minute % 60, value.get('days'),
+                   date.fromisoformat(on_date) if on_date else None, int(value.get('skip', 0)))
+
+    @property
+    def one_shot(self):
+        return self.on_date is not None
+
+    def next_fire(self, after, calendar=None):
+        """First fire time strictly after the datetime `after`, or None.
+
+        `skip` only applies when a CalendarIndex is given.
+        """
+        if self.on_date is not None:
+            fire = datetime.combine(self.on_date, datetime.min.time()).replace(hour=self.hour, minute=self.minute)
+            return fire if fire > after else None
+
+        fire = self.next_recurring(after)
+        if self.skip and calendar is not None:
+            # Give up after ten years of consecutive skipped days
+            for _ in range(3660):
+                if fire is None or not calendar.flags(fire.date()) & self.skip:
+                    return fire
+                fire = self.next_recurring(fire)
+            return None
+        return fire
+
+    def next_recurring(self, after):
+        fire = after.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        if fire <= after:
+            fire += timedelta(days=1)
+        if self.days is None:
+            return fire
+        for _ in range(7):
+            if fire.weekday() in self.days:
+                return fire
+            fire += timedelta(days=1)
+        return None
+
+class AlarmSchedule:
+    """Alarms kept in a heap ordered by next fire time.
+
+    Edits and removals bump a per-alarm version instead of searching the
+    heap; stale heap entries are discarded when they reach the head. Checking
+    whether anything is due is O(1) in the number of alarms.
+    """
+
+    def __init__(self, calendar=None):
+        self.alarms = {}
+        self.versions = {}
+        self.heap = []
+        self.next_id = 1
+        # CalendarIndex consulted for alarms with skip flags
+        self.calendar = calendar
+
+    def __len__(self):
+        return len(self.alarms)
+
+    def push(self, alarm_id, after):
+        fire = self.alarms[alarm_id].next_fire(after, self.calendar)
+        if fire is not None:
+            heapq.heappush(self.heap, (fire, alarm_id, self.versions[alarm_id]))
+
+    def add(self, alarm, now=None):
+        alarm_id = self.next_id
+        self.next_id += 1
+        self.alarms[alarm_id] = alarm
+        self.versions[alarm_id] = 0
+        self.push(alarm_id, now or datetime.now())
+        return alarm_id
+
+    def replace(self, alarm_id, alarm, now=None):
+        self.alarms[alarm_id] = alarm
+        self.versions[alarm_id] += 1
+        self.push(alarm_id, now or datetime.now())
+
+    def remove(self, alarm_id):
+        if self.alarms.pop(alarm_id, None) is not None:
+            del self.versions[alarm_id]
+
+    def reschedule(self, now):
+        """Recompute every alarm's next fire time, e.g. after calendar flags changed."""
+        for alarm_id in self.alarms:
+            self.versions[alarm_id] += 1
+            self.push(alarm_id, now)
+
+    def discard_stale(self):
+        while self.heap:
+            _, alarm_id, version = self.heap[0]
+            if self.versions.get(alarm_id) == version:
+                return
+            heapq.heappop(self.heap)
+
+    def peek(self):
+        """(fire time, alarm id) of the next alarm, or None."""
+        self.discard_stale()
+        if not self.heap:
+            return None
+        fire, alarm_id, _ = self.heap[0]
+        return fire, alarm_id
+
+    def pop_due(self, now):
+        """Remove and return [(fire time, alarm id, alarm)] for every alarm due at `now`.
+
+        Recurring alarms are rescheduled after their fire time; one-shots are dropped.
+        """
+        fired = []
+        while True:
+            head = self.peek()
+            if head is None or head[0] > now:
+                return fired
+            fire, alarm_id = head
+            heapq.heappop(self.heap)
+            alarm = self.alarms[alarm_id]
+            fired.append((fire, alarm_id, alarm))
+            if alarm.one_shot:
+                self.remove(alarm_id)
+            else:
+                self.push(alarm_id, fire)
+
+class SystemClock:
+    """Wall-clock and monotonic time from the OS."""
+
+    # monotonic() is time.monotonic(), so it can schedule real timers
+    realtime = True
+
+    def now(self):
+        return datetime.now()
+
+    def monotonic(self):
+        return time.monotonic()
+
+class VirtualClock:
+    """Clock that only moves when advance() is called.
+
+    With `tz` (a tzinfo, e.g. zoneinfo.ZoneInfo('America/New_York')) now()
+    returns naive local wall time for a UTC instant, so advancing across a
+    DST change makes the wall clock jump exactly as it would on a device.
+    """
+
+    realtime = False
+
+    def __init__(self, start, tz=None):
+        self.tz = tz
+        self.mono = 0.0
+        if tz is not None:
+            self.instant = start.replace(tzinfo=tz).astimezone(timezone.utc)
+        else:
+            self.instant = start
+
+    def now(self):
+        if self.tz is not None:
+            return self.instant.astimezone(self.tz).replace(tzinfo=None)
+        return self.instant
+
+    def monotonic(self):
+        return self.mono
+
+    def advance(self, seconds):
+        self.instant += timedelta(seconds=seconds)
+        self.mono += seconds
+
+class NullAudio:
+    """Audio backend that plays nothing; it only tracks whether the alarm would be sounding."""
+
+    def __init__(self):
+        self.playing = False
+        self.starts = 0
+
+    def play_alarm(self):
+        self.playing = True
+        self.starts += 1
+
+    def stop_alarm(self):
+        self.playing = False
+
+    def is_playing(self):
+        return self.playing
+
+class RuleBasedHolidays:
+    """Offline holiday provider built on us_federal_holidays()."""
+
+    def __init__(self):
+        self.cache = {}
+
+    def holidays_for(self, year):
+        if year not in self.cache:
+            self.cache[year] = us_federal_holidays(year)
+        return self.cache[year]
+
+    def is_holiday(self, date_obj):
+        return date_obj.strftime("%Y-%m-%d") in self.holidays_for(date_obj.year)
+
+# Day flags kept by CalendarIndex
+DAY_WEEKEND = 1
+DAY_HOLIDAY = 2
+DAY_BLACKOUT = 4
+DAY_FLAG_NAMES = ((DAY_WEEKEND, "Weekend"), (DAY_HOLIDAY, "Holiday"), (DAY_BLACKOUT, "Blackout"))
+
+class CalendarIndex:
+    """Per-day flags (DAY_WEEKEND | DAY_HOLIDAY | DAY_BLACKOUT) for whole years.
+
+    Each year is built once into one byte per day from the holiday
+    provider's set for that year plus the blackout dates, and rebuilt only
+    if the provider's set changes (e.g. a fetch replaces the offline rules).
+    The built years form one contiguous buffer indexed by day ordinal, so
+    "which of the next N fire dates are flagged" is a strided slice per
+    weekday scanned by a compiled regex, or with `use_numpy` and NumPy
+    installed a single fancy-indexing operation. NumPy only pays off for
+    queries over thousands of dates, so it is opt-in.
+    """
+
+    def __init__(self, holidays, use_numpy=False):
+        self.holidays = holidays
+        self.np = None
+        if use_numpy:
+            try:
+                # Optional, and imported lazily as it is slow to import
+                import numpy
+                self.np = numpy
+            except ImportError:
+                pass
+        self.blackouts = set()
+        self.builds = 0
+        # mask -> compiled byte class matching any flags value with a mask bit set
+        self.patterns = {}
+        self.clear()
+
+    def clear(self):
+        # year -> (holiday set it was built from, bytearray of day flags)
+        self.years = {}
+        self.first_year = self.last_year = None
+        self.span = bytearray()
+        self.span_start = 0
+        self.span_np = None
+
+    def set_holidays(self, holidays):
+        self.holidays = holidays
+        self.clear()
+
+    def build_year(self, year, holiday_dates):
+        start = date(year, 1, 1)
+        base = start.toordinal()
+        flags = bytearray(date(year + 1, 1, 1).toordinal() - base)
+        for weekday in (5, 6):
+            first = (weekday - start.weekday()) % 7
+            flags[first::7] = bytes([DAY_WEEKEND]) * len(range(first, len(flags), 7))
+        for s in holiday_dates:
+            day = date.fromisoformat(s)
+            if day.year == year:
+                flags[day.toordinal() - base] |= DAY_HOLIDAY
+        for day in self.blackouts:
+            if day.year == year:
+                flags[day.toordinal() - base] |= DAY_BLACKOUT
+        self.builds += 1
+        return flags
+
+    def ensure(self, first_year, last_year):
+        """Make the buffer cover first_year..last_year with current holiday data."""
+        rebuilt = []
+        for year in range(first_year, last_year + 1):
+            dates = self.holidays.holidays_for(year)
+            built = self.years.get(year)
+            if built is None or (built[0] is not dates and built[0] != dates):
+                self.years[year] = (dates, self.build_year(year, dates))
+                rebuilt.append(year)
+        if not rebuilt:
+            return
+
+        if self.first_year is not None and self.first_year <= first_year and last_year <= self.last_year:
+            # Same span: patch the rebuilt years in place
+            for year in rebuilt:
+                offset = date(year, 1, 1).toordinal() - self.span_start
+                flags = self.years[year][1]
+                self.span[offset:offset + len(flags)] = flags
+            return
+
+        lo = first_year if self.first_year is None else min(first_year, self.first_year)
+        hi = last_year if self.last_year is None else max(last_year, self.last_year)
+        for year in range(lo, hi + 1):
+            if year not in self.years:
+                dates = self.holidays.holidays_for(year)
+                self.years[year] = (dates, self.build_year(year, dates))
+        self.first_year, self.last_year = lo, hi
+        self.span = bytearray(b''.join(self.years[y][1] for y in range(lo, hi + 1)))
+        self.span_start = date(lo, 1, 1).toordinal()
+        if self.np is not None:
+            # Shares memory with span, so in-place patches show through
+            self.span_np = self.np.frombuffer(self.span, dtype=self.np.uint8)
+
+    def flags(self, day):
+        """Flags for one date."""
+        self.ensure(day.year, day.year)
+        return self.span[day.toordinal() - self.span_start]
+
+    def set_blackout(self, day, on=True):
+        if on:
+            self.blackouts.add(day)
+        else:
+            self.blackouts.discard(day)
+        built = self.years.get(day.year)
+        if built is None:
+            return
+        flags = built[1]
+        i = day.toordinal() - date(day.year, 1, 1).toordinal()
+        flags[i] = flags[i] | DAY_BLACKOUT if on else flags[i] & ~DAY_BLACKOUT
+        if self.first_year <= day.year <= self.last_year:
+            self.span[day.toordinal() - self.span_start] = flags[i]
+
+    def flagged(self, first, count, days=None, mask=DAY_WEEKEND | DAY_HOLIDAY | DAY_BLACKOUT):
+        """[(date, flags)] for the flagged dates among the next `count` fire dates.
+
+        Fire dates start at `first` (inclusive) and fall on the weekdays in
+        `days` (0=Monday), or on every day if `days` is None. Only dates with
+        one of the `mask` flags set are returned, in date order.
+        """
+        if count <= 0:
+            return []
+        wd = first.weekday()
+        offsets = [0] if days is None else [i for i in range(7) if (wd + i) % 7 in days]
+        if not offsets:
+            return []
+        step = 1 if days is None else 7
+        weeks, rem = divmod(count - 1, len(offsets))
+        base = first.toordinal()
+        last = base + weeks * step + offsets[rem]
+        self.ensure(first.year, date.fromordinal(last).year)
+        start = base - self.span_start
+
+        if self.span_np is not None:
+            np = self.np
+            idx = (start + step * np.arange(weeks + 1)[:, None] + np.array(offsets)).ravel()[:count]
+            values = self.span_np[idx]
+            hits = idx[np.flatnonzero(values & mask)]
+            return [(date.fromordinal(self.span_start + int(i)), int(self.span[i])) for i in hits]
+
+        # One strided slice per fire weekday, scanned in C for bytes matching the mask
+        pattern = self.patterns.get(mask)
+        if pattern is None:
+            pattern = self.patterns[mask] = re.compile(
+                b'[' + b''.join(re.escape(bytes([v])) for v in range(256) if v & mask) + b']')
+        end = last - self.span_start + 1
+        hits = []
+        for off in offsets:
+            column = self.span[start + off:end:step]
+            hits.extend(start + off + step * m.start() for m in pattern.finditer(column))
+        hits.sort()
+        return [(date.fromordinal(self.span_start + i), self.span[i]) for i in hits]
+
+def flag_reasons(flags):
+    """Names of the day flags set in `flags`, e.g. ['Weekend', 'Holiday']."""
+    return [name for bit, name in DAY_FLAG_NAMES if flags & bit]
+
+
+class AlarmEngine:
+    """Alarm state and trigger logic for one clock.
+
+    The clock-face alarm (alarm_hour/alarm_minute/alarm_active) is the
+    primary alarm in `schedule`; further alarms can be added to the
+    schedule directly. Call update() regularly; seconds_until_next_event()
+    says how long it is safe to sleep in between.
+    """
+
+    def __init__(self, clock=None, audio=None, holidays=None):
+        self.clock = clock or SystemClock()
+        self.audio = audio or NullAudio()
+        # Weekend/holiday/blackout flags per day, built from the holiday provider
+        self.calendar = CalendarIndex(holidays or RuleBasedHolidays())
+        # Called after any change to persistent state (see settings_values)
+        self.on_change = None
+        # Called as on_alarm(fire time, alarm id, alarm) when an alarm starts ringing
+        self.on_alarm = None
+
+        now = self.clock.now()
+        future = now + timedelta(minutes=1)
+        self.alarm_hour = future.hour
+        self.alarm_minute = future.minute
+        self.alarm_set_time = f"{self.alarm_hour:02d}:{self.alarm_minute:02d}"
+        self.alarm_active = False
+        self.previewing_alarm = False
+        # Monotonic deadline for the post-activation preview
+        self.preview_end_time = 0
+        # How late an alarm may still start ringing if updates were delayed
+        self.alarm_catchup = timedelta(minutes=5)
+
+        self.brightness_level = 1.0
+        self.day_brightness = 1.0
+        self.night_brightness = 0.5
+        # Whether the clock-face alarm passes over holidays and blackout days
+        self.skip_holidays = False
+
+        # All alarms; the one set from the clock face is tracked as the primary alarm.
+        # Others added with add_alarm() are saved with the settings
+        self.schedule = AlarmSchedule(self.calendar)
+        self.primary_alarm_id = None
+        # Saved form of the other alarms, rebuilt only after they change
+        self.alarms_value = None
+        self.ring_until = None
+        self.alarm_ringing = False
+        # Fire time handed to an audio backend that can start alarms on its own
+        self.armed_fire = None
+        self.arm_ahead = timedelta(seconds=90)
+
+        # Per-frame clock snapshot; strings and night mode change once a minute
+        self.frame_minute = None
+        self.begin_frame()
+        self.last_update_mono = None
+
+    @property
+    def holidays(self):
+        return self.calendar.holidays
+
+    @holidays.setter
+    def holidays(self, provider):
+        # A new provider invalidates every built year
+        self.calendar.set_holidays(provider)
+
+    def settings_values(self):
+        return {
+            'alarm_set_time': self.alarm_set_time,
+            'day_brightness': self.day_brightness,
+            'night_brightness': self.night_brightness,
+            'alarm_active': self.alarm_active,
+            'skip_holidays': self.skip_holidays,
+            'blackout_dates': sorted(d.isoformat() for d in self.calendar.blackouts),
+            'alarms': self.alarms_settings_value(),
+        }
+
+    def alarms_settings_value(self):
+        if self.alarms_value is None:
+            self.alarms_value = [a.settings_value() for alarm_id, a in self.schedule.alarms.items()
+                                 if alarm_id != self.primary_alarm_id]
+        return self.alarms_value
+
+    def apply_settings(self, values):
+        try:
+            if 'alarm_set_time' in values:
+                h, m = map(int, values['alarm_set_time'].split(':'))
+                self.alarm_hour, self.alarm_minute = h % 24, m % 60
+                self.alarm_set_time = f"{self.alarm_hour:02d}:{self.alarm_minute:02d}"
+            self.day_brightness = float(values.get('day_brightness', self.day_brightness))
+            self.night_brightness = float(values.get('night_brightness', self.night_brightness))
+            self.alarm_active = bool(values.get('alarm_active', self.alarm_active))
+            self.skip_holidays = bool(values.get('skip_holidays', self.skip_holidays))
+            for s in values.get('blackout_dates', []):
+                self.calendar.set_blackout(date.fromisoformat(s))
+            if 'alarms' in values:
+                for alarm_id in [i for i in self.schedule.alarms if i != self.primary_alarm_id]:
+                    self.schedule.remove(alarm_id)
+                now = self.clock.now()
+                for value in values['alarms']:
+                    alarm = Alarm.from_settings(value)
+                    # One-shots that passed while the clock was off are dropped
+                    if not alarm.one_shot or alarm.next_fire(now) is not None:
+                        self.schedule.add(alarm, now)
+                self.alarms_value = None
+        except Exception as e:
+            print(f"Ignoring invalid settings: {e}")
+        self.sync_primary_alarm()
+
+    def changed(self):
+        if self.on_change:
+            self.on_change()
+
+    def begin_frame(self):
+        """Read the clocks once for this frame and refresh per-minute state on rollover."""
+        self.frame_now = self.clock.now()
+        self.frame_mono = self.clock.monotonic()
+        minute = self.frame_now.replace(second=0, microsecond=0)
+        if minute != self.frame_minute:
+            self.frame_minute = minute
+            now = self.frame_now
+            self.night_mode = now.hour >= 23 or now.hour < 7
+            self.clock_strings = format_clock(now.hour, now.minute)
+            self.date_strings = (MONTHS[now.month - 1], f"{now.day:02d}")
+
+    def is_night_mode(self):
+        return self.night_mode
+
+    def is_federal_holiday(self, date_obj):
+        return bool(self.calendar.flags(date_obj) & DAY_HOLIDAY)
+
+    def set_skip_holidays(self, skip):
+        self.skip_holidays = skip
+        self.sync_primary_alarm()
+        self.changed()
+
+    def set_blackout(self, day, on=True):
+        """Mark or unmark `day` as a blackout day and reschedule alarms around it."""
+        self.calendar.set_blackout(day, on)
+        self.schedule.reschedule(self.clock.now())
+        self.changed()
+
+    def upcoming_warnings(self, weeks=2, alarm_id=None):
+        """[(date, reasons)] for fire dates in the next `weeks` weeks on weekends, holidays or blackout days.
+
+        Looks at the primary alarm by default, or at the clock-face time if
+        the alarm is off. Skip flags are ignored, so skipped days are listed too.
+        """
+        if alarm_id is None:
+            alarm_id = self.primary_alarm_id
+        alarm = self.schedule.alarms.get(alarm_id) or Alarm(self.alarm_hour, self.alarm_minute)
+        first = alarm.next_fire(self.clock.now())
+        if first is None:
+            return []
+        if alarm.one_shot:
+            count = 1
+        else:
+            count = weeks * (7 if alarm.days is None else len(alarm.days))
+        return [(day, flag_reasons(flags)) for day, flags in self.calendar.flagged(first.date(), count, alarm.days)]
+
+    def add_alarm(self, alarm):
+        """Schedule another alarm besides the clock-face one; returns its id."""
+        alarm_id = self.schedule.add(alarm, self.clock.now())
+        self.alarms_value = None
+        self.changed()
+        return alarm_id
+
+    def remove_alarm(self, alarm_id):
+        self.schedule.remove(alarm_id)
+        self.alarms_value = None
+        self.changed()
+
+    def set_alarm_time(self, hour, minute):
+        self.alarm_hour = hour
+        self.alarm_minute = minute
+        self.alarm_set_time = f"{hour:02d}:{minute:02d}"
+        self.sync_primary_alarm()
+        self.changed()
+
+    def set_brightness(self, val):
+        """Set the brightness for the current day/night period."""
+        if self.is_night_mode():
+            self.night_brightness = val
+        else:
+            self.day_brightness = val
+        self.brightness_level = val
+        self.changed()
+
+    def set_brightness_levels(self, day=None, night=None):
+        """Set the day and/or night brightness; the current level follows on the next update()."""
+        if day is not None:
+            self.day_brightness = day
+        if night is not None:
+            self.night_brightness = night
+        self.changed()
+
+    def toggle_alarm(self):
+        """Turn the alarm off, or on if no confirmation is needed.
+
+        Returns a warning message when the next alarm would fall on a
+        weekend or holiday; the alarm then stays off until activate_alarm()
+        is called.
+        """
+        # If alarm is currently ON, turn it OFF immediately
+        if self.alarm_active:
+            self.alarm_active = False
+            self.previewing_alarm = False
+            self.sync_primary_alarm()
+            self.changed()
+            return None
+
+        # If turning ON, check for Weekend/Holiday warnings
+        warning = self.alarm_warning()
+        if warning:
+            return warning
+
+        # If no warning needed, activate immediately
+        self.activate_alarm()
+        return None
+
+    def alarm_warning(self):
+        """Warning message if the alarm's next day is a weekend or holiday, else None."""
+        now = self.clock.now()
+        # Construct alarm time for today to compare
+        alarm_time_today = now.replace(hour=self.alarm_hour, minute=self.alarm_minute, second=0, microsecond=0)
+        
+        is_tomorrow = alarm_time_today <= now
+        
+        if is_tomorrow:
+            target_date = now.date() + timedelta(days=1)
+        else:
+            target_date = now.date()
+
+        # Weekend, holiday and blackout flags for the target date in one lookup
+        reasons = flag_reasons(self.calendar.flags(target_date))
+        if reasons:
+            return f"Alarm for {' & '.join(reasons)}. Continue?"
+        return None
+
+    def set_alarm_active(self, active):
+        """Turn the alarm on or off without asking about weekends and holidays."""
+        if active and not self.alarm_active:
+            self.activate_alarm()
+        elif not active and self.alarm_active:
+            self.toggle_alarm()
+
+    def activate_alarm(self):
+        self.alarm_active = True
+        self.previewing_alarm = True
+        self.preview_end_time = self.clock.monotonic() + 2
+        self.sync_primary_alarm()
+        self.changed()
+
+    def sync_primary_alarm(self):
+        """Mirror alarm_active/alarm_hour/alarm_minute into the schedule."""
+        if not self.alarm_active:
+            if self.primary_alarm_id is not None:
+                self.schedule.remove(self.primary_alarm_id)
+                self.primary_alarm_id = None
+            self.stop_alarm_sound()
+            return
+        alarm = Alarm(self.alarm_hour, self.alarm_minute,
+                      skip=DAY_HOLIDAY | DAY_BLACKOUT if self.skip_holidays else 0)
+        # Schedule from the start of the current minute so an alarm set for
+        # this very minute still rings now
+        since = self.clock.now().replace(second=0, microsecond=0) - timedelta(microseconds=1)
+        if self.primary_alarm_id is None:
+            self.primary_alarm_id = self.schedule.add(alarm, since)
+        else:
+            self.schedule.replace(self.primary_alarm_id, alarm, since)
+
+    def update(self):
+        self.begin_frame()
+
+        # Sync brightness based on time
+        if self.is_night_mode():
+            self.brightness_level = self.night_brightness
+        else:
+            self.brightness_level = self.day_brightness
+
+        if self.previewing_alarm and self.frame_mono > self.preview_end_time:
+            if self.alarm_active:
+                self.previewing_alarm = False
+        
+        # Check alarm trigger: only the head of the schedule is looked at
+        now = self.frame_now
+        since_last = None
+        if self.last_update_mono is not None:
+            since_last = timedelta(seconds=self.frame_mono - self.last_update_mono)
+        self.last_update_mono = self.frame_mono
+
+        head = self.schedule.peek()
+        if head is not None and head[0] <= now:
+            dropped = False
+            for fire, alarm_id, alarm in self.schedule.pop_due(now):
+                # pop_due() removed fired one-shots from the schedule
+                dropped = dropped or alarm.one_shot
+                # Lateness is bounded by the real time since the last update, so a
+                # wall-clock jump over the alarm (DST, NTP) does not count as late
+                late = now - fire
+                if since_last is not None:
+                    late = min(late, since_last)
+                if late < timedelta(minutes=1):
+                    # Ring for the rest of the alarm minute
+                    self.ring_until = now - late + timedelta(minutes=1)
+                elif late <= self.alarm_catchup:
+                    # A delayed frame missed the alarm minute; still ring for a full minute
+                    self.ring_until = now + timedelta(minutes=1)
+                else:
+                    print(f"Skipped alarm due at {fire:%H:%M}, {late} late")
+                    continue
+                if self.on_alarm:
+                    self.on_alarm(fire, alarm_id, alarm)
+            if dropped:
+                self.alarms_value = None
+                self.changed()
+
+        if self.ring_until is not None:
+            if now < self.ring_until:
+                # The first call also takes over a start made by an armed backend
+                if not self.alarm_ringing or not self.audio.is_playing():
+                    self.audio.play_alarm()
+                    self.alarm_ringing = True
+            else:
+                self.stop_alarm_sound()
+
+        self.arm_audio()
+
+    def arm_audio(self):
+        """Hand the next fire time to an audio backend with arm(), which then
+        starts the alarm at that instant rather than at the next update().
+
+        Only alarms due within `arm_ahead` are armed, so the wall-clock
+        difference converted to a monotonic deadline never spans a DST change.
+        """
+        arm = getattr(self.audio, 'arm', None)
+        if arm is None or not getattr(self.clock, 'realtime', False):
+            return
+        head = self.schedule.peek()
+        fire = None
+        if head is not None and self.frame_now < head[0] <= self.frame_now + self.arm_ahead:
+            fire = head[0]
+        if fire != self.armed_fire:
+            self.armed_fire = fire
+            arm(None if fire is None else self.frame_mono + (fire - self.frame_now).total_seconds())
+
+    def stop_alarm_sound(self):
+        # Only stop a sound we started: the UI may be previewing the same sound
+        if self.alarm_ringing:
+            self.audio.stop_alarm()
+        self.alarm_ringing = False
+        self.ring_until = None
+
+    def seconds_until_next_event(self):
+        """Seconds until the engine's state can next change on its own:
+        minute rollover, end of the preview, the next alarm or the end of ringing."""
+        now = self.clock.now()
+        candidates = [60 - now.second - now.microsecond / 1e6]
+        if self.previewing_alarm:
+            candidates.append(self.preview_end_time - self.clock.monotonic())
+        head = self.schedule.peek()
+        if head is not None:
+            candidates.append((head[0] - now).total_seconds())
+        if self.ring_until is not None:
+            candidates.append((self.ring_until - now).total_seconds())
+        return max(0, min(candidates))
+
+    def run(self, stop=None):
+        """Headless loop: sleep until the next event, then update. `stop` is a threading.Event."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            self.update()
+            stop.wait(self.seconds_until_next_event() + 0.005)
+
+def main():
+    """Run the alarm engine without a display, using the clock face's settings file."""
+    class PrintAudio(NullAudio):
+        def play_alarm(self):
+            super().play_alarm()
+            print(f"{datetime.now():%H:%M:%S} alarm ringing")
+
+        def stop_alarm(self):
+            super().stop_alarm()
+            print(f"{datetime.now():%H:%M:%S} alarm stopped")
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    engine = AlarmEngine(audio=PrintAudio())
+    settings = SettingsStore(os.path.join(base_dir, 'settings.json'))
+    engine.apply_settings(settings.load())
+    print(f"Alarm {'on' if engine.alarm_active else 'off'} at {engine.alarm_set_time}")
+    try:
+        engine.run()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
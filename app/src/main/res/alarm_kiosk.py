@@ -0,0 +1,213 @@
+"""Host several clock displays in one process.
+
+Each clock is an AlarmClockApp with its own alarm state, brightness,
+settings file and mixer channels, drawing into an offscreen surface. Decoded
+assets, scaled surfaces, glyph atlases, fonts, sounds and holiday data come
+from one SharedAssets. Changed frames are written to image files or to raw
+framebuffer devices:
+
+    python alarm_kiosk.py --clocks 4 --size 800x480 --output 'frames/clock{n}.png'
+    python alarm_kiosk.py --clocks 2 --framebuffer '/dev/fb{n}'
+    python alarm_kiosk.py --bench 1 2 4 8 16 32 64
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import tempfile
+import threading
+import contextlib
+
+# Clocks draw offscreen; no window is ever shown
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+from alarm_engine import RuleBasedHolidays
+from alarm import (AlarmClockApp, Layout, PygameAlarmAudio, SharedAssets, BASE_DIR, reserve_channels,
+                   init_offscreen_display, parse_size)
+
+
+def save_frame(surface, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    pygame.image.save(surface, path)
+
+
+def write_framebuffer(surface, path, fmt='BGRA'):
+    """Copy a frame pixel for pixel to a raw framebuffer device (or file).
+
+    The device is assumed to be 32bpp with the surface's width and height.
+    """
+    data = pygame.image.tostring(surface, fmt)
+    with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+        f.write(data)
+
+
+class KioskHost:
+    """N independent clocks rendering offscreen from one SharedAssets."""
+
+    def __init__(self, count=0, size=Layout.DESIGN_SIZE, settings_dir=BASE_DIR, clock=None, holidays=None):
+        pygame.init()
+        init_offscreen_display()
+        self.size = tuple(size)
+        self.settings_dir = settings_dir
+        self.clock = clock
+        self.shared = SharedAssets(holidays)
+        self.clocks = []
+        # Local control server, off unless enable_control() is called; it sets
+        # `wake` to cut the sleep between steps short when requests arrive
+        self.control = None
+        self.wake = threading.Event()
+        for _ in range(count):
+            self.add_clock()
+
+    def add_clock(self):
+        index = len(self.clocks)
+        # Every clock gets its own alarm and onset probe channels so alarms
+        # ring independently and previews played with Sound.play() never take them
+        channels = reserve_channels(2 * index, 2) or ()
+
+        app = AlarmClockApp(clock=self.clock, shared=self.shared,
+                            surface=pygame.Surface(self.size).convert(),
+                            settings_path=os.path.join(self.settings_dir, f'settings-{index}.json'),
+                            audio=PygameAlarmAudio(*channels))
+        self.clocks.append(app)
+        if self.control:
+            self.control.add(app)
+        return app
+
+    def enable_control(self, port=8765, host='127.0.0.1'):
+        """Serve the local control API (see alarm_control) for every clock; clock n is index n."""
+        from alarm_control import ControlServer
+        self.control = ControlServer(self.clocks, host, port, wake=self.wake.set)
+        self.control.start()
+        return self.control
+
+    def step(self):
+        """Update and redraw every clock; returns each clock's dirty rects."""
+        if self.control:
+            self.control.poll()
+        dirty = []
+        for app in self.clocks:
+            app.update()
+            dirty.append(app.draw_dirty())
+        return dirty
+
+    def seconds_until_next_change(self):
+        if self.control and self.control.pending():
+            return 0
+        return min((app.seconds_until_next_change() for app in self.clocks), default=1.0)
+
+    def flush(self):
+        for app in self.clocks:
+            app.settings.flush()
+
+    def run(self, frames=None, output=None, framebuffer=None):
+        """Render until interrupted, or for `frames` steps, writing every clock whose frame changed.
+
+        `output` and `framebuffer` are path templates where {n} is the clock index.
+        """
+        count = 0
+        try:
+            while frames is None or count < frames:
+                for n, (app, dirty) in enumerate(zip(self.clocks, self.step())):
+                    if not dirty:
+                        continue
+                    if output:
+                        save_frame(app.screen, output.format(n=n))
+                    if framebuffer:
+                        write_framebuffer(app.screen, framebuffer.format(n=n))
+                count += 1
+                if frames is None or count < frames:
+                    # Same padding as AlarmClockApp.run(): wake just after the boundary
+                    self.wake.wait(self.seconds_until_next_change() + 0.005)
+                    self.wake.clear()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self.control:
+                self.control.stop()
+            self.flush()
+
+
+def rss_bytes():
+    """Current resident set size; falls back to the peak where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def bench(counts, size=Layout.DESIGN_SIZE, frames=20):
+    """Resident memory and per-step time as clocks are added to one host."""
+    baseline = rss_bytes()
+    host = KioskHost(size=size, settings_dir=tempfile.mkdtemp(), holidays=RuleBasedHolidays())
+    results = {}
+    for target in sorted(counts):
+        while len(host.clocks) < target:
+            app = host.add_clock()
+            # Give every clock its own state
+            n = len(host.clocks) - 1
+            app.engine.set_alarm_time(5 + n % 4, (n * 7) % 60)
+            app.engine.set_brightness(0.4 + 0.2 * (n % 4))
+        host.shared.assets.wait()
+        host.step()
+
+        times = []
+        for _ in range(frames):
+            start = time.perf_counter()
+            for app in host.clocks:
+                app.update()
+                app.draw()
+            times.append(time.perf_counter() - start)
+        rss = rss_bytes()
+        results[str(target)] = {
+            'rss_mb': rss / 2**20,
+            'mb_over_baseline': (rss - baseline) / 2**20,
+            'mb_per_clock': (rss - baseline) / 2**20 / target,
+            'frame_all_clocks_ms': sum(times) / frames * 1000,
+        }
+    first = results[str(min(counts))]
+    for count, r in results.items():
+        # What the same clocks would take as one process each
+        r['separate_processes_mb'] = first['rss_mb'] / min(counts) * int(count)
+    host.flush()
+    return {'size': list(host.size), 'baseline_mb': baseline / 2**20, 'clocks': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clocks', type=int, default=4)
+    parser.add_argument('--size', type=parse_size,
+                        default=Layout.DESIGN_SIZE, help="display size WIDTHxHEIGHT (default 1280x800)")
+    parser.add_argument('--frames', type=int, help="stop after this many steps (default: run until interrupted)")
+    parser.add_argument('--output', help="write changed frames as images, e.g. 'frames/clock{n}.png'")
+    parser.add_argument('--framebuffer', help="write changed frames raw to a device, e.g. '/dev/fb{n}'")
+    parser.add_argument('--settings-dir', default=BASE_DIR, help="where settings-<n>.json are kept")
+    parser.add_argument('--control-port', type=int, help="serve the local control API on this localhost port")
+    parser.add_argument('--bench', type=int, nargs='+', metavar='N',
+                        help="print memory and frame time for these clock counts as JSON")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+        # Keep stdout clean for the JSON report
+        with contextlib.redirect_stdout(sys.stderr):
+            report = bench(args.bench, args.size)
+        json.dump(report, sys.stdout, indent=2)
+        print()
+        return
+
+    host = KioskHost(args.clocks, args.size, args.settings_dir)
+    if args.control_port:
+        host.enable_control(args.control_port)
+    host.run(args.frames, args.output, args.framebuffer)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+"""Record an AlarmClockApp session and replay it headless.
+
+A recording holds the starting settings, every run() frame's input events
+and clock readings, and a digest of the pixels each frame drew. Replaying
+feeds the same events and readings back through run_frame() offscreen, so
+every frame takes the same path and must draw the same pixels; any frame
+that does not is reported as a mismatch next to the frame timings:
+
+    python alarm.py --record session.rec
+    python alarm_replay.py session.rec [--speed recorded|max] [--output report.json]
+
+Start recording before run(); requests applied by a control server are not
+recorded, so a session that used one will not replay cleanly.
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import zlib
+import argparse
+import tempfile
+import threading
+import contextlib
+from datetime import datetime, timedelta
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+from alarm_stats import percentile
+
+VERSION = 1
+# Wall clock readings are stored as whole microseconds since this instant
+EPOCH = datetime(1970, 1, 1)
+
+# Events run_frame() acts on, by the name they are stored under
+EVENT_NAMES = {
+    pygame.MOUSEBUTTONDOWN: 'down',
+    pygame.MOUSEBUTTONUP: 'up',
+    pygame.MOUSEMOTION: 'motion',
+    pygame.MOUSEWHEEL: 'wheel',
+    pygame.VIDEORESIZE: 'resize',
+    pygame.QUIT: 'quit',
+}
+EVENT_TYPES = {name: kind for kind, name in EVENT_NAMES.items()}
+
+
+def micros(value):
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def encode_event(event):
+    name = EVENT_NAMES.get(event.type)
+    if name is None:
+        return None
+    if name in ('down', 'up', 'motion'):
+        return [name, *event.pos]
+    if name == 'wheel':
+        return [name, event.y]
+    if name == 'resize':
+        return [name, *event.size]
+    return [name]
+
+
+def decode_event(record):
+    name, *args = record
+    if name in ('down', 'up', 'motion'):
+        return pygame.event.Event(EVENT_TYPES[name], pos=tuple(args))
+    if name == 'wheel':
+        return pygame.event.Event(EVENT_TYPES[name], x=0, y=args[0])
+    if name == 'resize':
+        return pygame.event.Event(EVENT_TYPES[name], size=tuple(args))
+    return pygame.event.Event(EVENT_TYPES[name])
+
+
+def frame_digest(screen, rects):
+    """CRC of the rects drawn and their pixels, or None if nothing was drawn.
+
+    Taken from AlarmClockApp.after_draw, i.e. before any stats overlay is
+    drawn on top, so recordings made with and without the overlay match.
+    """
+    bounds = screen.get_rect()
+    crc = 0
+    drawn = False
+    for rect in rects:
+        rect = bounds.clip(rect)
+        if not rect.width or not rect.height:
+            continue
+        drawn = True
+        crc = zlib.crc32(b'%d,%d,%d,%d;' % tuple(rect), crc)
+        crc = zlib.crc32(pygame.image.tobytes(screen.subsurface(rect), 'RGB'), crc)
+    return crc if drawn else None
+
+
+class RecordingClock:
+    """Wraps the engine's clock and logs what the frame loop reads from it.
+
+    Only reads made on the recording thread inside a frame are logged;
+    run() also reads the clock between frames to decide how long to sleep,
+    which a replay never does.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.realtime = getattr(clock, 'realtime', False)
+        self.thread = threading.get_ident()
+        self.nows = self.monos = None
+
+    def now(self):
+        value = self.clock.now()
+        if self.nows is not None and threading.get_ident() == self.thread:
+            self.nows.append(micros(value))
+        return value
+
+    def monotonic(self):
+        value = self.clock.monotonic()
+        if self.monos is not None and threading.get_ident() == self.thread:
+            self.monos.append(value)
+        return value
+
+    def begin_frame(self):
+        self.nows, self.monos = [], []
+
+    def end_frame(self):
+        reads = self.nows, self.monos
+        self.nows = self.monos = None
+        return reads
+
+
+class Recorder:
+    """Writes one app's run() frames to a gzipped JSON-lines file.
+
+    The first line is a header with the display size and settings; each
+    frame is [seconds since the first frame, events, wall clock reads,
+    monotonic reads, frame ms, digest]; the last line holds the holiday
+    sets the engine's calendar was built from.
+    """
+
+    def __init__(self, app, path):
+        self.app = app
+        self.clock = RecordingClock(app.engine.clock)
+        app.engine.clock = self.clock
+        app.settings.monotonic = self.clock.monotonic
+        app.after_draw = self.after_draw
+        self.file = gzip.open(path, 'wt', encoding='utf-8')
+        self.frames = 0
+        self.first = None
+        self.start = None
+        self.digest = None
+        self.events = None
+
+        values = app.engine.settings_values()
+        values['active_alarm_file'] = app.active_alarm_file
+        start = [micros(self.clock.clock.now()), self.clock.clock.monotonic()]
+        self.write({'version': VERSION, 'size': list(app.screen.get_size()),
+                    'dirty_rendering': app.dirty_rendering, 'settings': values, 'start': start})
+
+    def write(self, record):
+        self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def begin_frame(self, events):
+        self.events = [e for e in map(encode_event, events) if e]
+        self.digest = None
+        self.clock.begin_frame()
+        self.start = time.perf_counter()
+        if self.first is None:
+            self.first = self.start
+
+    def after_draw(self, screen, rects):
+        self.digest = frame_digest(screen, rects)
+
+    def end_frame(self):
+        work = time.perf_counter() - self.start
+        nows, monos = self.clock.end_frame()
+        self.write([round(self.start - self.first, 6), self.events, nows, monos, round(work * 1000, 3), self.digest])
+        self.frames += 1
+
+    def close(self):
+        if self.file is None:
+            return
+        calendar = self.app.engine.calendar
+        self.write({'holidays': {str(year): sorted(dates) for year, (dates, _) in calendar.years.items()}})
+        self.file.close()
+        self.file = None
+        print(f"Recorded {self.frames} frames")
+
+
+class ReplayClock:
+    """Plays back one recorded frame's clock reads at a time.
+
+    Reads past the end of a frame's log repeat the last value and count as
+    mismatches, as do reads a frame logged but the replay never made.
+    """
+
+    realtime = False
+
+    def __init__(self, start):
+        self.last_now = EPOCH + timedelta(microseconds=start[0])
+        self.last_mono = start[1]
+        # None outside a frame: reads then repeat the last value without counting
+        self.nows = self.monos = None
+        self.mismatches = 0
+
+    def now(self):
+        if self.nows:
+            self.last_now = EPOCH + timedelta(microseconds=self.nows.pop())
+        elif self.nows is not None:
+            self.mismatches += 1
+        return self.last_now
+
+    def monotonic(self):
+        if self.monos:
+            self.last_mono = self.monos.pop()
+        elif self.monos is not None:
+            self.mismatches += 1
+        return self.last_mono
+
+    def begin_frame(self, nows, monos):
+        # Reversed so each read is a pop from the end
+        self.nows, self.monos = nows[::-1], monos[::-1]
+
+    def end_frame(self):
+        self.mismatches += len(self.nows) + len(self.monos)
+        self.nows = self.monos = None
+
+
+class StaticHolidays:
+    """Holiday provider serving the sets saved in a recording; other years use the offline rules."""
+
+    def __init__(self, sets):
+        from alarm_engine import us_federal_holidays
+        self.sets = {int(year): frozenset(dates) for year, dates in sets.items()}
+        self.rules = us_federal_holidays
+
+    def holidays_for(self, year):
+        dates = self.sets.get(year)
+        if dates is None:
+            dates = self.sets[year] = self.rules(year)
+        return dates
+
+    def is_holiday(self, date_obj):
+        return date_obj.strftime("%Y-%m-%d") in self.holidays_for(date_obj.year)
+
+
+def load(path):
+    """(header, frames, holiday sets) from a recording; a truncated tail is dropped."""
+    header, frames, holidays = None, [], {}
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if header is None:
+                    header = record
+                elif isinstance(record, list):
+                    frames.append(record)
+                else:
+                    holidays = record.get('holidays', holidays)
+    except (EOFError, zlib.error, json.JSONDecodeError) as e:
+        print(f"Recording ends early ({e}); replaying {len(frames)} frames")
+    if header is None or header.get('version') != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} recording")
+    return header, frames, holidays
+
+
+def replay(path, speed=None):
+    """Run a recording offscreen; `speed` 1.0 paces frames as recorded, None runs flat out."""
+    from alarm import AlarmClockApp, init_offscreen_display
+    from alarm_engine import NullAudio
+
+    header, frames, holidays = load(path)
+    clock = ReplayClock(header['start'])
+    settings_dir = tempfile.mkdtemp()
+    settings_path = os.path.join(settings_dir, 'settings.json')
+    with open(settings_path, 'w') as f:
+        json.dump(header['settings'], f)
+
+    pygame.init()
+    init_offscreen_display()
+    # Recorded holidays from the start: no fetch worker, and alarms are scheduled against them
+    app = AlarmClockApp(clock=clock, surface=pygame.Surface(header['size']).convert(),
+                        settings_path=settings_path, audio=NullAudio(), holidays=StaticHolidays(holidays))
+    app.dirty_rendering = header['dirty_rendering']
+    drawn = []
+    app.after_draw = lambda screen, rects: drawn.append(frame_digest(screen, rects))
+    app.enable_stats(window=max(len(frames), 1))
+    app.assets.wait()
+
+    mismatched = []
+    start = time.perf_counter()
+    for n, (offset, events, nows, monos, _, digest) in enumerate(frames):
+        if speed:
+            delay = start + offset / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        drawn.clear()
+        clock.begin_frame(nows, monos)
+        app.run_frame([decode_event(e) for e in events])
+        clock.end_frame()
+        if (drawn[0] if drawn else None) != digest:
+            mismatched.append(n)
+    elapsed = time.perf_counter() - start
+    app.settings.flush()
+
+    recorded = [f[4] / 1000 for f in frames] or [0.0]
+    return {
+        'frames': len(frames),
+        'mismatched_frames': len(mismatched),
+        'first_mismatches': mismatched[:10],
+        'clock_mismatches': clock.mismatches,
+        'elapsed_s': elapsed,
+        'recorded': {
+            'p50_ms': percentile(recorded, 50) * 1000,
+            'p99_ms': percentile(recorded, 99) * 1000,
+            'max_ms': max(recorded) * 1000,
+        },
+        'replayed': app.stats.summary(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('recording')
+    parser.add_argument('--speed', choices=('recorded', 'max'), default='max',
+                        help="pace frames as they were recorded, or run them back to back (default)")
+    parser.add_argument('--output', help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    # Keep stdout clean for the JSON report; the app prints its own diagnostics
+    with contextlib.redirect_stdout(sys.stderr):
+        report = replay(args.recording, 1.0 if args.speed == 'recorded' else None)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 1 if report['mismatched_frames'] or report['clock_mismatches'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""Fast-forward alarm simulation on a virtual clock.
+
+Steps an AlarmEngine (or a headless AlarmClockApp with --app) through
+simulated time one minute at a time and checks that every alarm fires
+exactly once, in its own minute, across midnight, weekends, holidays, DST
+changes and the year boundary; that night mode switches at 23:00/07:00;
+and that the weekend/holiday warning matches the calendar. Prints a JSON
+report with simulated-minutes-per-second throughput:
+
+    python alarm_sim.py [--start 2026-01-01] [--days 365] [--tz America/New_York] [--app]
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime, timedelta
+
+from alarm_engine import Alarm, AlarmEngine, NullAudio, RuleBasedHolidays, VirtualClock, us_federal_holidays
+
+
+def setup_alarms(engine, start):
+    """Alarms covering the interesting cases; returns {alarm id: Alarm}."""
+    # Clock-face alarm, set the way the UI does it
+    engine.set_alarm_time(7, 0)
+    engine.activate_alarm()
+    alarms = {engine.primary_alarm_id: engine.schedule.alarms[engine.primary_alarm_id]}
+
+    extra = [
+        Alarm(6, 30, days=range(5)),      # weekdays only
+        Alarm(2, 30),                     # inside the spring-forward gap
+        Alarm(1, 30),                     # repeated hour at fall-back
+        Alarm(23, 59),                    # last minute of the day/year
+        Alarm(12, 0, on_date=(start + timedelta(days=10)).date()),
+        Alarm(15, 45, on_date=(start + timedelta(days=200)).date()),
+    ]
+    for a in extra:
+        alarms[engine.schedule.add(a, start)] = a
+    return alarms
+
+
+def expected_fires(alarm, start, end):
+    """Dates on which `alarm` should fire within (start, end], by wall-clock time."""
+    dates = []
+    day = start.date()
+    while day <= end.date():
+        fire = datetime.combine(day, datetime.min.time()).replace(hour=alarm.hour, minute=alarm.minute)
+        applies = (alarm.on_date == day) if alarm.one_shot else (alarm.days is None or day.weekday() in alarm.days)
+        if applies and start < fire <= end:
+            dates.append(day)
+        day += timedelta(days=1)
+    return dates
+
+
+def simulate(start, days, tz=None, step=60, app=False):
+    clock = VirtualClock(start, tz)
+    if app:
+        import alarm
+        # Keep the run deterministic, offline and away from the real settings file
+        view = alarm.AlarmClockApp(clock=clock, holidays=RuleBasedHolidays(),
+                                   settings_path=os.path.join(tempfile.mkdtemp(), 'settings.json'))
+        view.engine.audio = view.audio = NullAudio()
+        engine = view.engine
+    else:
+        view = None
+        engine = AlarmEngine(clock=clock)
+
+    alarms = setup_alarms(engine, clock.now())
+    fires = []
+    engine.on_alarm = lambda fire, alarm_id, a: fires.append((alarm_id, fire, clock.now(), prev_wall))
+
+    errors = []
+    step_delta = timedelta(seconds=step)
+    sim_start = clock.now()
+    steps = int(days * 86400 / step)
+    started = time.perf_counter()
+    for _ in range(steps):
+        prev_wall = clock.now()
+        clock.advance(step)
+        if view:
+            view.update()
+            view.draw_dirty()
+        else:
+            engine.update()
+        now = clock.now()
+
+        night = now.hour >= 23 or now.hour < 7
+        if engine.is_night_mode() != night:
+            errors.append(f"{now}: night mode {engine.is_night_mode()}, expected {night}")
+
+        if now.hour == 12 and now.minute == 0:
+            # Clock-face alarm is at 07:00, so at noon the warning is about tomorrow
+            tomorrow = now.date() + timedelta(days=1)
+            weekend = tomorrow.weekday() >= 5
+            holiday = tomorrow.strftime("%Y-%m-%d") in us_federal_holidays(tomorrow.year)
+            warning = engine.alarm_warning() or ""
+            if ("Weekend" in warning) != weekend or ("Holiday" in warning) != holiday:
+                errors.append(f"{now}: warning {warning!r} for {tomorrow} (weekend={weekend}, holiday={holiday})")
+    elapsed = time.perf_counter() - started
+    sim_end = clock.now()
+
+    # Every fire happened in the step it became due, in the alarm's own minute
+    # unless the wall clock jumped over it (DST)
+    for alarm_id, fire, wall, prev in fires:
+        a = alarms[alarm_id]
+        if (fire.hour, fire.minute) != (a.hour, a.minute):
+            errors.append(f"alarm {alarm_id} scheduled at {fire}, expected {a.hour:02d}:{a.minute:02d}")
+        if not prev < fire <= wall:
+            errors.append(f"alarm {alarm_id} due {fire} fired at {wall} (previous step {prev})")
+        elif wall - prev == step_delta and (wall.hour, wall.minute) != (a.hour, a.minute):
+            errors.append(f"alarm {alarm_id} due {fire} fired outside its minute at {wall}")
+
+    # Exactly once per expected date
+    for alarm_id, a in alarms.items():
+        got = sorted(fire.date() for i, fire, _, _ in fires if i == alarm_id)
+        want = expected_fires(a, sim_start, sim_end)
+        if got != want:
+            missing = sorted(set(want) - set(got))
+            extra = sorted(d for d in set(got) if got.count(d) > want.count(d))
+            errors.append(f"alarm {alarm_id}: {len(got)} fires, expected {len(want)}; "
+                          f"missing {missing[:5]}, duplicated/unexpected {extra[:5]}")
+
+    if engine.audio.starts != len(fires):
+        errors.append(f"{engine.audio.starts} ring starts for {len(fires)} fires")
+
+    return {
+        'mode': 'app' if app else 'engine',
+        'start': sim_start.isoformat(),
+        'end': sim_end.isoformat(),
+        'tz': str(tz) if tz else None,
+        'simulated_minutes': steps * step / 60,
+        'elapsed_s': elapsed,
+        'minutes_per_second': steps * step / 60 / elapsed if elapsed else None,
+        'fires': len(fires),
+        'ring_starts': engine.audio.starts,
+        'error_count': len(errors),
+        'errors': errors[:20],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--start', default=f"{datetime.now().year}-01-01",
+                        help="simulation start, ISO date or datetime (default: Jan 1st this year)")
+    parser.add_argument('--days', type=float, default=365)
+    parser.add_argument('--tz', default='America/New_York',
+                        help="IANA zone for DST transitions, or 'none' for naive local time")
+    parser.add_argument('--step', type=int, default=60, help="seconds per simulated frame")
+    parser.add_argument('--app', action='store_true',
+                        help="drive a headless AlarmClockApp (update + draw_dirty) instead of the bare engine")
+    args = parser.parse_args(argv)
+
+    tz = None
+    if args.tz.lower() != 'none':
+        from zoneinfo import ZoneInfo
+        tz = ZoneInfo(args.tz)
+    if args.app:
+        os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+    # Keep stdout clean for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = simulate(datetime.fromisoformat(args.start), args.days, tz, args.step, args.app)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 1 if report['error_count'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""Frame-time instrumentation for AlarmClockApp.run().
+
+A FrameStats only exists while instrumentation is enabled, so a normal run
+pays for nothing but an `if stats:` per phase. When enabled it keeps a
+rolling window of frames with per-phase timings (events, update, draw,
+overlay, flip), inclusive time spent in selected view methods, and
+per-frame deltas of the view's counters. summary() condenses the window;
+a log path makes it append one summary per interval as JSON lines.
+"""
+import json
+import time
+from collections import deque
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class FrameStats:
+    PHASES = ('events', 'update', 'draw', 'overlay', 'flip')
+
+    def __init__(self, counters, window=300, log_path=None, log_interval=10.0):
+        # Live dict of cumulative counters owned by the view; sampled each frame
+        self.counters = counters
+        self.frames = deque(maxlen=window)
+        self.log_path = log_path
+        self.log_interval = log_interval
+        self.next_log = time.perf_counter() + log_interval
+        self.method_times = {}
+        self.last_counts = dict(counters)
+        self.current = None
+        self.mark = None
+
+    def wrap(self, obj, name):
+        """Time every call to obj.name (inclusive), accumulated per frame."""
+        method = getattr(obj, name)
+        perf_counter = time.perf_counter
+        times = self.method_times
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                times[name] = times.get(name, 0.0) + perf_counter() - start
+
+        setattr(obj, name, timed)
+
+    def begin_frame(self):
+        self.mark = time.perf_counter()
+        self.current = {'start': self.mark}
+        self.method_times.clear()
+
+    def phase(self, name):
+        now = time.perf_counter()
+        self.current[name] = self.current.get(name, 0.0) + now - self.mark
+        self.mark = now
+
+    def end_frame(self):
+        frame = self.current
+        frame['total'] = self.mark - frame.pop('start')
+        frame['methods'] = dict(self.method_times)
+        counts = dict(self.counters)
+        frame['counters'] = {k: v - self.last_counts.get(k, 0) for k, v in counts.items()}
+        self.last_counts = counts
+        self.frames.append(frame)
+
+        if self.log_path and self.mark >= self.next_log:
+            self.next_log = self.mark + self.log_interval
+            self.write_log()
+
+    def summary(self):
+        frames = self.frames
+        if not frames:
+            return {'frames': 0}
+        n = len(frames)
+        totals = [f['total'] for f in frames]
+        methods = {}
+        counters = {}
+        for f in frames:
+            for k, v in f['methods'].items():
+                methods[k] = methods.get(k, 0.0) + v
+            for k, v in f['counters'].items():
+                counters[k] = counters.get(k, 0) + v
+        return {
+            'frames': n,
+            'p50_ms': percentile(totals, 50) * 1000,
+            'p99_ms': percentile(totals, 99) * 1000,
+            'max_ms': max(totals) * 1000,
+            'phases_ms': {p: sum(f.get(p, 0.0) for f in frames) / n * 1000 for p in self.PHASES},
+            'methods_ms': {k: v / n * 1000 for k, v in sorted(methods.items())},
+            'counters_per_frame': {k: v / n for k, v in sorted(counters.items())},
+        }
+
+    def write_log(self):
+        record = {'time': time.time(), **self.summary()}
+        try:
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        except OSError as e:
+            print(f"Error writing stats log: {e}")
@@ -0,0 +1,10 @@
+"""Host-side tests for the pygame clock scripts in src/main/res."""
+import os
+import sys
+
+RES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'main', 'res'))
+sys.path.insert(0, RES_DIR)
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
@@ -0,0 +1,94 @@
+import random
+from functools import lru_cache
+from datetime import date, timedelta
+
+import pytest
+
+from alarm_engine import (CalendarIndex, RuleBasedHolidays, DAY_WEEKEND, DAY_HOLIDAY, DAY_BLACKOUT,
+                          us_federal_holidays)
+
+MASKS = [DAY_WEEKEND, DAY_HOLIDAY, DAY_BLACKOUT, DAY_HOLIDAY | DAY_BLACKOUT,
+         DAY_WEEKEND | DAY_HOLIDAY | DAY_BLACKOUT]
+
+
+holiday_set = lru_cache(maxsize=None)(us_federal_holidays)
+
+
+def naive_flagged(first, count, days, mask, blackouts):
+    """The next `count` fire dates checked one by one."""
+    hits = []
+    day = first
+    n = 0
+    while n < count:
+        if days is None or day.weekday() in days:
+            n += 1
+            flags = DAY_WEEKEND if day.weekday() >= 5 else 0
+            if day.strftime("%Y-%m-%d") in holiday_set(day.year):
+                flags |= DAY_HOLIDAY
+            if day in blackouts:
+                flags |= DAY_BLACKOUT
+            if flags & mask:
+                hits.append((day, flags))
+        day += timedelta(days=1)
+    return hits
+
+
+def random_queries(count, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        first = date(2026, 1, 1) + timedelta(days=rng.randrange(3 * 365))
+        days = None if rng.random() < 0.2 else frozenset(rng.sample(range(7), rng.randrange(1, 8)))
+        yield first, rng.choice([1, 2, 7, 50, 400, 1500]), days, rng.choice(MASKS)
+
+
+def index_with_blackouts(use_numpy, seed=0):
+    rng = random.Random(seed)
+    index = CalendarIndex(RuleBasedHolidays(), use_numpy=use_numpy)
+    blackouts = {date(2026, 1, 1) + timedelta(days=rng.randrange(6 * 365)) for _ in range(60)}
+    for day in blackouts:
+        index.set_blackout(day)
+    return index, blackouts
+
+
+def test_flagged_matches_a_date_by_date_scan():
+    index, blackouts = index_with_blackouts(use_numpy=False)
+    assert index.np is None
+    for first, count, days, mask in random_queries(300):
+        assert index.flagged(first, count, days, mask) == naive_flagged(first, count, days, mask, blackouts)
+
+
+def test_numpy_path_matches_the_bytearray_path():
+    pytest.importorskip('numpy')
+    fast, _ = index_with_blackouts(use_numpy=True)
+    plain, _ = index_with_blackouts(use_numpy=False)
+    assert fast.np is not None and plain.np is None
+    for first, count, days, mask in random_queries(500, seed=1):
+        got = fast.flagged(first, count, days, mask)
+        assert got == plain.flagged(first, count, days, mask)
+        # Plain ints, as the bytearray path returns
+        assert all(type(flags) is int for _, flags in got)
+        assert fast.span_np is not None
+
+    # Blackouts patched in place after the span exists show through the shared buffer
+    day = date(2027, 6, 9)
+    for index in (fast, plain):
+        index.set_blackout(day)
+    assert fast.flagged(day, 1, None, DAY_BLACKOUT) == plain.flagged(day, 1, None, DAY_BLACKOUT) == [(day, DAY_BLACKOUT)]
+    for index in (fast, plain):
+        index.set_blackout(day, False)
+    assert fast.flagged(day, 1, None, DAY_BLACKOUT) == []
+
+
+def test_changed_holiday_set_rebuilds_only_that_year():
+    class Provider(RuleBasedHolidays):
+        def holidays_for(self, year):
+            return self.cache.setdefault(year, us_federal_holidays(year))
+
+    provider = Provider()
+    index = CalendarIndex(provider, use_numpy=False)
+    index.ensure(2026, 2028)
+    builds = index.builds
+    provider.cache[2027] = provider.cache[2027] | {'2027-03-17'}
+    index.ensure(2026, 2028)
+    assert index.builds == builds + 1
+    assert index.flags(date(2027, 3, 17)) & DAY_HOLIDAY
@@ -0,0 +1,131 @@
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from alarm_engine import Alarm, AlarmEngine, RuleBasedHolidays, VirtualClock
+from alarm_sim import simulate
+
+NEW_YORK = ZoneInfo('America/New_York')
+
+
+@pytest.mark.parametrize('start, days, tz', [
+    (datetime(2026, 3, 1), 14, NEW_YORK),     # spring forward on Mar 8th
+    (datetime(2026, 10, 25), 14, NEW_YORK),   # fall back on Nov 1st
+    (datetime(2026, 12, 20), 21, None),       # holidays and the year boundary
+])
+def test_simulated_weeks_fire_every_alarm_once(start, days, tz):
+    report = simulate(start, days, tz)
+    assert report['errors'] == []
+    assert report['fires'] > days
+    assert report['ring_starts'] == report['fires']
+
+
+def test_alarm_rings_for_its_minute_then_stops():
+    clock = VirtualClock(datetime(2030, 3, 4, 6, 58))
+    engine = AlarmEngine(clock=clock, holidays=RuleBasedHolidays())
+    engine.set_alarm_time(7, 0)
+    engine.activate_alarm()
+
+    rang = []
+    for _ in range(4 * 60):
+        clock.advance(1)
+        engine.update()
+        rang.append((clock.now(), engine.audio.is_playing()))
+    ringing = [now for now, playing in rang if playing]
+    assert ringing[0] == datetime(2030, 3, 4, 7, 0)
+    assert ringing[-1] == datetime(2030, 3, 4, 7, 0, 59)
+    assert len(ringing) == 60
+    assert engine.audio.starts == 1
+
+
+def test_night_mode_and_brightness_follow_the_clock():
+    clock = VirtualClock(datetime(2030, 3, 4, 22, 59))
+    engine = AlarmEngine(clock=clock, holidays=RuleBasedHolidays())
+    engine.set_brightness_levels(day=0.9, night=0.3)
+    engine.update()
+    assert not engine.is_night_mode() and engine.brightness_level == 0.9
+    clock.advance(60)
+    engine.update()
+    assert engine.is_night_mode() and engine.brightness_level == 0.3
+    clock.advance(timedelta(hours=8).total_seconds())
+    engine.update()
+    assert not engine.is_night_mode() and engine.brightness_level == 0.9
+
+
+def engine_before_seven():
+    clock = VirtualClock(datetime(2030, 3, 4, 6, 59, 30))
+    engine = AlarmEngine(clock=clock, holidays=RuleBasedHolidays())
+    engine.set_alarm_time(7, 0)
+    engine.activate_alarm()
+    engine.update()
+    return engine, clock
+
+
+def test_delayed_update_within_catchup_still_rings_a_full_minute():
+    engine, clock = engine_before_seven()
+    # The next update arrives two minutes after the alarm minute started
+    clock.advance(150)
+    engine.update()
+    assert engine.audio.is_playing() and engine.audio.starts == 1
+    assert engine.ring_until == datetime(2030, 3, 4, 7, 3)
+    clock.advance(59)
+    engine.update()
+    assert engine.audio.is_playing()
+    clock.advance(2)
+    engine.update()
+    assert not engine.audio.is_playing()
+
+
+def test_update_later_than_catchup_skips_the_alarm():
+    engine, clock = engine_before_seven()
+    assert engine.alarm_catchup == timedelta(minutes=5)
+    clock.advance(30 + 6 * 60)
+    engine.update()
+    assert not engine.audio.is_playing() and engine.audio.starts == 0
+    # Still scheduled for tomorrow
+    assert engine.schedule.peek() == (datetime(2030, 3, 5, 7, 0), engine.primary_alarm_id)
+
+
+def engine_at(now):
+    engine = AlarmEngine(clock=VirtualClock(now), holidays=RuleBasedHolidays())
+    engine.set_alarm_time(7, 0)
+    engine.activate_alarm()
+    return engine
+
+
+def test_skipped_holiday_moves_the_alarm_to_the_next_day():
+    # Christmas 2030 is a Wednesday
+    engine = engine_at(datetime(2030, 12, 24, 12, 0))
+    assert engine.schedule.peek()[0] == datetime(2030, 12, 25, 7, 0)
+    engine.set_skip_holidays(True)
+    assert engine.schedule.peek() == (datetime(2030, 12, 26, 7, 0), engine.primary_alarm_id)
+    engine.set_skip_holidays(False)
+    assert engine.schedule.peek()[0] == datetime(2030, 12, 25, 7, 0)
+
+
+def test_blackout_reschedules_the_alarm():
+    engine = engine_at(datetime(2030, 3, 4, 12, 0))
+    engine.set_skip_holidays(True)
+    assert engine.schedule.peek()[0] == datetime(2030, 3, 5, 7, 0)
+    engine.set_blackout(date(2030, 3, 5))
+    assert engine.schedule.peek()[0] == datetime(2030, 3, 6, 7, 0)
+    engine.set_blackout(date(2030, 3, 5), on=False)
+    assert engine.schedule.peek()[0] == datetime(2030, 3, 5, 7, 0)
+
+
+def test_upcoming_warnings_for_a_weekday_alarm_cross_the_year():
+    engine = engine_at(datetime(2030, 12, 20, 12, 0))
+    engine.set_blackout(date(2030, 12, 30))
+    # Blacked out on a weekend, which a weekday alarm never fires on
+    engine.set_blackout(date(2031, 1, 4))
+    alarm_id = engine.add_alarm(Alarm(6, 30, days=range(5)))
+    assert engine.upcoming_warnings(weeks=2, alarm_id=alarm_id) == [
+        (date(2030, 12, 25), ['Holiday']),
+        (date(2030, 12, 30), ['Blackout']),
+        (date(2031, 1, 1), ['Holiday']),
+    ]
+    # The every-day primary alarm also hits weekends; its 14 days end on Jan 3rd
+    days = [day for day, _ in engine.upcoming_warnings(weeks=2)]
+    assert days == [date(2030, 12, 21), date(2030, 12, 22), date(2030, 12, 25), date(2030, 12, 28),
+                    date(2030, 12, 29), date(2030, 12, 30), date(2031, 1, 1)]
@@ -0,0 +1,101 @@
+import json
+import time
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from alarm_engine import HolidayProvider, us_federal_holidays
+
+
+class StandIn:
+    """Local HTTP server answering the holiday API; the first `failures` requests get a 500."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.requests = []
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                year = int(self.path.strip('/'))
+                stand_in.requests.append(year)
+                if stand_in.failures:
+                    stand_in.failures -= 1
+                    self.send_error(500)
+                    return
+                body = json.dumps([{'date': f'{year}-03-17'}, {'date': f'{year}-12-25'}]).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/{{year}}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stand_in():
+    servers = []
+
+    def make(failures=0):
+        servers.append(StandIn(failures))
+        return servers[-1]
+
+    yield make
+    for server in servers:
+        server.close()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_lookup_answers_from_rules_until_fetched(tmp_path, stand_in):
+    server = stand_in()
+    provider = HolidayProvider(str(tmp_path / 'cache.json'), url=server.url)
+    # Not started: nothing is fetched and lookups still answer
+    assert provider.holidays_for(2030) == us_federal_holidays(2030)
+
+    provider.start([2030])
+    wait_for(lambda: 2030 in provider.cache)
+    assert provider.holidays_for(2030) == {'2030-03-17', '2030-12-25'}
+    assert provider.is_holiday(date(2030, 3, 17))
+
+
+def test_fetched_years_persist_and_are_not_refetched(tmp_path, stand_in):
+    server = stand_in()
+    path = str(tmp_path / 'cache.json')
+    provider = HolidayProvider(path, url=server.url)
+    provider.start([2030])
+    wait_for(lambda: 2030 in provider.cache)
+    wait_for(lambda: (tmp_path / 'cache.json').exists())
+
+    again = HolidayProvider(path, url=server.url)
+    assert again.holidays_for(2030) == {'2030-03-17', '2030-12-25'}
+    again.start([2030])
+    time.sleep(0.1)
+    assert server.requests == [2030]
+
+
+def test_failed_fetch_is_retried_with_backoff(tmp_path, stand_in):
+    server = stand_in(failures=2)
+    provider = HolidayProvider(str(tmp_path / 'cache.json'), url=server.url, retry_base=0.05)
+    provider.start([2030])
+    wait_for(lambda: 2030 in provider.cache)
+    assert server.requests == [2030, 2030, 2030]
+    # A failure never caches an empty year
+    assert provider.holidays_for(2030) == {'2030-03-17', '2030-12-25'}
@@ -0,0 +1,57 @@
+import pytest
+import pygame
+
+import alarm
+import alarm_engine
+from alarm_engine import NullAudio, RuleBasedHolidays
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    def refuse(*args, **kwargs):
+        raise AssertionError("HolidayProvider started")
+    monkeypatch.setattr(alarm_engine.HolidayProvider, 'start', refuse)
+
+
+def make_app(tmp_path, name, size=(800, 480), shared=None):
+    pygame.init()
+    alarm.init_offscreen_display()
+    app = alarm.AlarmClockApp(surface=pygame.Surface(size).convert(), shared=shared,
+                              settings_path=str(tmp_path / f'{name}.json'), audio=NullAudio(),
+                              holidays=RuleBasedHolidays())
+    app.assets.wait()
+    return app
+
+
+def draw(app):
+    """Fill every per-size shared cache for the app's current size."""
+    app.run_frame([])
+    app.ensure_glyph_atlas()
+    app.get_dim_overlay()
+    app.get_popup_backdrop()
+
+
+def test_resizing_keeps_only_the_current_size(tmp_path):
+    app = make_app(tmp_path, 'settings')
+    shared = app.shared
+    for n in range(60):
+        app.resize((400 + n * 10, 240 + n * 5))
+        draw(app)
+        assert list(shared.glyph_atlases) == [app.layout.size]
+        assert {key[1] for key in shared.overlays} == {app.layout.size}
+        assert list(shared.fonts) == [app.layout.font_size]
+        assert list(shared.text_caches) == [app.layout.font_size]
+
+
+def test_resizing_keeps_sizes_other_views_use(tmp_path):
+    first = make_app(tmp_path, 'first')
+    second = make_app(tmp_path, 'second', size=(1024, 600), shared=first.shared)
+    shared = first.shared
+    draw(second)
+    for n in range(10):
+        first.resize((400 + n * 10, 240 + n * 5))
+        draw(first)
+        assert set(shared.glyph_atlases) == {first.layout.size, second.layout.size}
+        assert {key[1] for key in shared.overlays} == {first.layout.size, second.layout.size}
+        assert set(shared.fonts) == {first.layout.font_size, second.layout.font_size}
+        assert set(shared.text_caches) == {first.layout.font_size, second.layout.font_size}
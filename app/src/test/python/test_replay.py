@@ -0,0 +1,70 @@
+import gzip
+import json
+from datetime import datetime
+
+import pytest
+import pygame
+
+import alarm
+import alarm_engine
+from alarm_engine import NullAudio, RuleBasedHolidays, VirtualClock
+from alarm_replay import replay
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    def refuse(*args, **kwargs):
+        raise AssertionError("HolidayProvider started")
+    monkeypatch.setattr(alarm_engine.HolidayProvider, 'start', refuse)
+
+
+def tap(pos):
+    return [pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=pos, button=1),
+            pygame.event.Event(pygame.MOUSEBUTTONUP, pos=pos, button=1)]
+
+
+def record(path, tmp_path, overlay=False, dirty=True):
+    """Record a short session of taps into set mode and the brightness slider."""
+    pygame.init()
+    alarm.init_offscreen_display()
+    clock = VirtualClock(datetime(2030, 3, 4, 6, 58, 50))
+    app = alarm.AlarmClockApp(clock=clock, surface=pygame.Surface((800, 480)).convert(),
+                              settings_path=str(tmp_path / 'settings.json'), audio=NullAudio(),
+                              holidays=RuleBasedHolidays())
+    app.dirty_rendering = dirty
+    app.enable_stats(overlay=overlay)
+    recorder = app.enable_recording(str(path))
+    rects = app.get_rects()
+    script = [[], tap(rects['settings'].center), tap(rects['ctrl_plus'].center), [],
+              tap(rects['ctrl_set'].center), tap(rects['ctrl_minus'].center), tap(rects['ctrl_set'].center),
+              tap(rects['brightness'].center), tap(rects['brightness_container'].midleft), [], [], []]
+    for events in script:
+        clock.advance(5)
+        recorder.begin_frame(events)
+        app.run_frame(events)
+        recorder.end_frame()
+    recorder.close()
+    return len(script)
+
+
+@pytest.mark.parametrize('overlay, dirty', [(False, True), (True, True), (True, False)])
+def test_replay_draws_the_recorded_frames(tmp_path, overlay, dirty):
+    path = tmp_path / 'session.rec'
+    frames = record(path, tmp_path, overlay, dirty)
+    report = replay(str(path))
+    assert report['frames'] == frames
+    assert report['mismatched_frames'] == 0
+    assert report['clock_mismatches'] == 0
+    assert report['replayed']['frames'] == frames
+
+
+def test_replay_reports_a_diverging_session(tmp_path):
+    path = tmp_path / 'session.rec'
+    record(path, tmp_path)
+    with gzip.open(path, 'rt') as f:
+        lines = [json.loads(line) for line in f]
+    # Drop the tap that enters set mode
+    lines[2][1] = []
+    with gzip.open(path, 'wt') as f:
+        f.writelines(json.dumps(line) + '\n' for line in lines)
+    assert replay(str(path))['mismatched_frames'] > 0
@@ -0,0 +1,166 @@
+import json
+import heapq
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import alarm_engine
+from alarm_engine import Alarm, AlarmEngine, AlarmSchedule, RuleBasedHolidays, VirtualClock, DAY_HOLIDAY
+
+START = datetime(2030, 3, 4, 0, 0, 30)
+
+
+@pytest.fixture
+def work(monkeypatch):
+    """Counts Alarm.next_fire calls and heap pops made by the schedule."""
+    counts = {'next_fire': 0, 'heappop': 0}
+    next_fire = Alarm.next_fire
+    heappop = heapq.heappop
+
+    def counting_next_fire(self, *args, **kwargs):
+        counts['next_fire'] += 1
+        return next_fire(self, *args, **kwargs)
+
+    def counting_heappop(heap):
+        counts['heappop'] += 1
+        return heappop(heap)
+
+    monkeypatch.setattr(Alarm, 'next_fire', counting_next_fire)
+    monkeypatch.setattr(alarm_engine.heapq, 'heappop', counting_heappop)
+    return counts
+
+
+def random_alarms(count, seed=0):
+    """Recurring, weekday and one-shot alarms, none due in the first hour after START."""
+    rng = random.Random(seed)
+    alarms = []
+    for _ in range(count):
+        hour, minute = rng.randrange(1, 24), rng.randrange(60)
+        kind = rng.random()
+        if kind < 0.4:
+            alarms.append(Alarm(hour, minute))
+        elif kind < 0.8:
+            alarms.append(Alarm(hour, minute, days=range(5)))
+        else:
+            alarms.append(Alarm(hour, minute, on_date=START.date() + timedelta(days=rng.randrange(1, 365))))
+    return alarms
+
+
+def engine_with(count):
+    clock = VirtualClock(START)
+    engine = AlarmEngine(clock=clock, holidays=RuleBasedHolidays())
+    for alarm in random_alarms(count):
+        engine.schedule.add(alarm, START)
+    return engine, clock
+
+
+def frame_work(count, work, frames=600):
+    engine, clock = engine_with(count)
+    for key in work:
+        work[key] = 0
+    for _ in range(frames):
+        clock.advance(1.0)
+        engine.update()
+        engine.schedule.peek()
+    return dict(work)
+
+
+def test_per_frame_work_does_not_grow_with_alarm_count(work):
+    small = frame_work(10, work)
+    large = frame_work(10000, work)
+    assert large == small
+    assert large == {'next_fire': 0, 'heappop': 0}
+
+
+def test_popping_a_due_alarm_touches_only_that_alarm(work):
+    schedule = AlarmSchedule()
+    for alarm in random_alarms(10000):
+        schedule.add(alarm, START)
+    early = schedule.add(Alarm(0, 30), START)
+    work['next_fire'] = work['heappop'] = 0
+
+    fired = schedule.pop_due(START.replace(minute=30, second=0))
+    assert [alarm_id for _, alarm_id, _ in fired] == [early]
+    # One pop for the fired entry, one next_fire to reschedule it
+    assert work == {'next_fire': 1, 'heappop': 1}
+
+
+def test_one_shot_alarms_are_dropped_after_firing():
+    schedule = AlarmSchedule()
+    when = START.replace(hour=6, minute=0, second=0)
+    once = schedule.add(Alarm(6, 0, on_date=START.date()), START)
+    daily = schedule.add(Alarm(6, 0), START)
+
+    fired = schedule.pop_due(when)
+    assert sorted(alarm_id for _, alarm_id, _ in fired) == [once, daily]
+    assert once not in schedule.alarms and len(schedule) == 1
+    assert schedule.peek() == (when + timedelta(days=1), daily)
+    assert schedule.pop_due(when + timedelta(days=1)) == [(when + timedelta(days=1), daily, schedule.alarms[daily])]
+
+
+def test_replaced_and_removed_alarms_leave_only_stale_entries():
+    schedule = AlarmSchedule()
+    moved = schedule.add(Alarm(6, 0), START)
+    gone = schedule.add(Alarm(6, 30), START)
+    kept = schedule.add(Alarm(7, 30), START)
+    schedule.replace(moved, Alarm(8, 0), START)
+    schedule.remove(gone)
+
+    day = START.replace(second=0)
+    fired = schedule.pop_due(day.replace(hour=9))
+    assert [(fire.hour, fire.minute, alarm_id) for fire, alarm_id, _ in fired] == [(7, 30, kept), (8, 0, moved)]
+    # The 06:00 and 06:30 entries were popped as stale, not fired
+    assert all(schedule.versions.get(alarm_id) == version for _, alarm_id, version in schedule.heap)
+    assert gone not in schedule.versions
+
+
+def test_alarms_fire_in_time_order():
+    alarms = random_alarms(2000, seed=1)
+    schedule = AlarmSchedule()
+    ids = {schedule.add(alarm, START): alarm for alarm in alarms}
+    end = START + timedelta(days=3)
+
+    expected = []
+    for alarm_id, alarm in ids.items():
+        fire = alarm.next_fire(START)
+        while fire is not None and fire <= end:
+            expected.append((fire, alarm_id))
+            fire = None if alarm.one_shot else alarm.next_fire(fire)
+
+    fired = []
+    now = START
+    while now < end:
+        now += timedelta(minutes=7)
+        fired.extend((fire, alarm_id) for fire, alarm_id, _ in schedule.pop_due(min(now, end)))
+    assert [fire for fire, _ in fired] == sorted(fire for fire, _ in fired)
+    assert sorted(fired) == sorted(expected)
+
+
+def test_added_alarms_survive_a_restart():
+    clock = VirtualClock(START)
+    engine = AlarmEngine(clock=clock, holidays=RuleBasedHolidays())
+    saves = []
+    engine.on_change = lambda: saves.append(json.loads(json.dumps(engine.settings_values())))
+    engine.set_alarm_time(7, 0)
+    engine.activate_alarm()
+    weekdays = engine.add_alarm(Alarm(6, 30, days=range(5), skip=DAY_HOLIDAY))
+    once = engine.add_alarm(Alarm(12, 0, on_date=START.date()))
+    assert len(saves[-1]['alarms']) == 2
+
+    restarted = AlarmEngine(clock=VirtualClock(START), holidays=RuleBasedHolidays())
+    restarted.apply_settings(saves[-1])
+    assert len(restarted.schedule) == 3
+    assert [a.settings_value() for i, a in restarted.schedule.alarms.items() if i != restarted.primary_alarm_id] \
+        == [engine.schedule.alarms[weekdays].settings_value(), engine.schedule.alarms[once].settings_value()]
+
+    # The one-shot fires, leaves the schedule and the saved alarms
+    clock.advance(12 * 3600)
+    engine.update()
+    assert once not in engine.schedule.alarms
+    assert saves[-1]['alarms'] == [engine.schedule.alarms[weekdays].settings_value()]
+
+    # Restarting after the one-shot's time drops it instead of keeping it forever
+    later = AlarmEngine(clock=VirtualClock(START + timedelta(days=1)), holidays=RuleBasedHolidays())
+    later.apply_settings(restarted.settings_values())
+    assert len(later.schedule) == 2
@@ -0,0 +1,43 @@
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import pygame
+
+from alarm import SoundCache, StreamedSound
+
+
+@pytest.fixture(scope='module', autouse=True)
+def mixer():
+    pygame.mixer.init()
+    yield
+    pygame.mixer.quit()
+
+
+def write_wav(path, seconds):
+    with wave.open(str(path), 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(22050)
+        w.writeframes(bytes(int(22050 * 2 * seconds)))
+    return str(path)
+
+
+def test_only_decodes_are_counted(tmp_path):
+    path = write_wav(tmp_path / 'beep.wav', 0.5)
+    cache = SoundCache()
+    counters = {'sound_decodes': 0}
+    first = cache.load(path, counters)
+    assert cache.load(path, counters) is first
+    # Concurrent loads from a loader pool share the one decode
+    with ThreadPoolExecutor(4) as pool:
+        assert all(s is first for s in pool.map(lambda _: cache.load(path, counters), range(8)))
+    assert counters['sound_decodes'] == cache.decodes == 1
+
+
+def test_long_files_stream_without_decoding(tmp_path):
+    path = write_wav(tmp_path / 'long.wav', 2.0)
+    cache = SoundCache(stream_threshold=1024)
+    counters = {'sound_decodes': 0}
+    assert isinstance(cache.load(path, counters), StreamedSound)
+    assert counters['sound_decodes'] == 0